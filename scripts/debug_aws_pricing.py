@@ -4,7 +4,9 @@ AWS Pricing APIのデバッグ用スクリプト
 利用可能なフィルターや属性を確認
 """
 import boto3
-import json
+from itertools import chain, islice
+
+from json_utils import json_loads
 
 def debug_pricing_api():
     print("🔧 AWS Pricing API デバッグ開始")
@@ -36,18 +38,20 @@ def debug_pricing_api():
         # 2. 特定のインスタンスタイプでサンプル検索
         print("2️⃣ サンプルインスタンス (m5.large) の情報を取得...")
         
-        sample_response = pricing_client.get_products(
+        # 先頭2件だけ必要なのでページネーターで取得件数を絞る
+        sample_pages = pricing_client.get_paginator('get_products').paginate(
             ServiceCode='AmazonEC2',
             Filters=[
                 {'Type': 'TERM_MATCH', 'Field': 'instanceType', 'Value': 'm5.large'}
             ],
-            MaxResults=3
+            PaginationConfig={'PageSize': 3, 'MaxItems': 2}
         )
+        sample_items = list(islice(chain.from_iterable(page['PriceList'] for page in sample_pages), 2))
         
-        print(f"📊 検索結果: {len(sample_response['PriceList'])}件")
+        print(f"📊 検索結果: {len(sample_items)}件")
         
-        for i, price_item in enumerate(sample_response['PriceList'][:2]):
-            price_data = json.loads(price_item)
+        for i, price_item in enumerate(sample_items):
+            price_data = json_loads(price_item)
             attributes = price_data.get('product', {}).get('attributes', {})
             
             print(f"\n🔍 結果 {i+1}:")
@@ -63,10 +67,10 @@ def debug_pricing_api():
             terms = price_data.get('terms', {})
             on_demand = terms.get('OnDemand', {})
             if on_demand:
-                first_term = list(on_demand.values())[0]
+                first_term = next(iter(on_demand.values()))
                 price_dimensions = first_term.get('priceDimensions', {})
                 if price_dimensions:
-                    first_dimension = list(price_dimensions.values())[0]
+                    first_dimension = next(iter(price_dimensions.values()))
                     price_per_unit = first_dimension.get('pricePerUnit', {})
                     usd_price = price_per_unit.get('USD', 'N/A')
                     print(f"   💰 On-Demand Price: ${usd_price}/hour")
@@ -89,7 +93,7 @@ def debug_pricing_api():
         print(f"📊 東京リージョン検索結果: {len(tokyo_response['PriceList'])}件")
         
         if tokyo_response['PriceList']:
-            price_data = json.loads(tokyo_response['PriceList'][0])
+            price_data = json_loads(tokyo_response['PriceList'][0])
             attributes = price_data.get('product', {}).get('attributes', {})
             
             print("🗾 東京リージョンの結果:")
@@ -100,10 +104,10 @@ def debug_pricing_api():
             terms = price_data.get('terms', {})
             on_demand = terms.get('OnDemand', {})
             if on_demand:
-                first_term = list(on_demand.values())[0]
+                first_term = next(iter(on_demand.values()))
                 price_dimensions = first_term.get('priceDimensions', {})
                 if price_dimensions:
-                    first_dimension = list(price_dimensions.values())[0]
+                    first_dimension = next(iter(price_dimensions.values()))
                     price_per_unit = first_dimension.get('pricePerUnit', {})
                     usd_price = price_per_unit.get('USD', 'N/A')
                     print(f"   💰 Price: ${usd_price}/hour")
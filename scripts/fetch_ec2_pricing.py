@@ -4,11 +4,19 @@ AWS API を使用してEC2料金を取得するスクリプト
 東京リージョン（ap-northeast-1）のEC2インスタンス料金を取得
 """
 import boto3
-import json
+from botocore.config import Config
 import time
 from typing import Dict, List, Set
 from pathlib import Path
 import re
+import logging
+
+from json_utils import json_loads, json_dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+# インスタンスタイプの形式チェック（例: m5.large, c5.xlarge）
+_is_instance_type = re.compile(r'^[a-z0-9]+\.[a-z0-9-]+$').match
 
 class EC2PricingFetcher:
     def __init__(self, region: str = "ap-northeast-1"):
@@ -20,7 +28,12 @@ class EC2PricingFetcher:
         """
         self.region = region
         # AWS Pricing APIは常にus-east-1リージョンを使用
-        self.pricing_client = boto3.client('pricing', region_name='us-east-1')
+        # 連続したページ取得時のスロットリングはadaptiveリトライで吸収する
+        self.pricing_client = boto3.client(
+            'pricing',
+            region_name='us-east-1',
+            config=Config(retries={"mode": "adaptive", "max_attempts": 10})
+        )
         
     def extract_instance_types_from_databricks_data(self, databricks_file: str) -> Set[str]:
         """
@@ -35,19 +48,18 @@ class EC2PricingFetcher:
         print("🔍 Databricks料金データからインスタンスタイプを抽出中...")
         
         try:
-            with open(databricks_file, 'r') as f:
-                data = json.load(f)
-            
-            instance_types = set()
+            with open(databricks_file, 'rb') as f:
+                data = json_loads(f.read())
             
             # 全ワークロードタイプから重複なしでインスタンスタイプを抽出
             workload_data = data["enterprise"]["aws"][self.region]
             
-            for workload_type, instances in workload_data.items():
-                for instance_type in instances.keys():
-                    # インスタンスタイプの形式をチェック（例: m5.large, c5.xlarge）
-                    if re.match(r'^[a-z0-9]+\.[a-z0-9-]+$', instance_type):
-                        instance_types.add(instance_type)
+            instance_types = {
+                instance_type
+                for instances in workload_data.values()
+                for instance_type in instances
+                if _is_instance_type(instance_type)
+            }
             
             print(f"✅ {len(instance_types)}個のユニークなインスタンスタイプを発見")
             return instance_types
@@ -56,12 +68,13 @@ class EC2PricingFetcher:
             print(f"❌ Databricksデータ読み込みエラー: {e}")
             return set()
     
-    def get_ec2_pricing(self, instance_types: Set[str]) -> Dict[str, Dict[str, float]]:
+    def get_ec2_pricing(self, instance_types: Set[str], page_size: int = 100) -> Dict[str, Dict[str, float]]:
         """
         指定されたインスタンスタイプのEC2料金を取得
         
         Args:
             instance_types: 取得対象のインスタンスタイプセット
+            page_size: 1リクエストあたりの取得件数（Pricing APIの上限は100）
             
         Returns:
             インスタンスタイプ別料金辞書
@@ -80,87 +93,111 @@ class EC2PricingFetcher:
         
         location = region_mapping.get(self.region, "Asia Pacific (Tokyo)")
         
-        for i, instance_type in enumerate(sorted(instance_types), 1):
-            print(f"📊 ({i}/{len(instance_types)}) {instance_type} の料金を取得中...")
+        # インスタンスタイプでは絞り込まず、共通フィルターで対象リージョンの全料金をページ単位で取得
+        filters = [
+            {'Type': 'TERM_MATCH', 'Field': 'location', 'Value': location},
+            {'Type': 'TERM_MATCH', 'Field': 'tenancy', 'Value': 'Shared'},
+            {'Type': 'TERM_MATCH', 'Field': 'operatingSystem', 'Value': 'Linux'},
+            {'Type': 'TERM_MATCH', 'Field': 'preInstalledSw', 'Value': 'NA'},
+            {'Type': 'TERM_MATCH', 'Field': 'capacitystatus', 'Value': 'Used'}
+        ]
+        
+        missing_error = "No matching price found"
+        
+        try:
+            paginator = self.pricing_client.get_paginator('get_products')
+            pages = paginator.paginate(
+                ServiceCode='AmazonEC2',
+                Filters=filters,
+                PaginationConfig={'PageSize': page_size}
+            )
             
-            try:
-                # AWS Pricing APIクエリ（適切なフィルターを使用）
-                response = self.pricing_client.get_products(
-                    ServiceCode='AmazonEC2',
-                    Filters=[
-                        {'Type': 'TERM_MATCH', 'Field': 'instanceType', 'Value': instance_type},
-                        {'Type': 'TERM_MATCH', 'Field': 'location', 'Value': location},
-                        {'Type': 'TERM_MATCH', 'Field': 'tenancy', 'Value': 'Shared'},
-                        {'Type': 'TERM_MATCH', 'Field': 'operatingSystem', 'Value': 'Linux'},
-                        {'Type': 'TERM_MATCH', 'Field': 'preInstalledSw', 'Value': 'NA'},
-                        {'Type': 'TERM_MATCH', 'Field': 'capacitystatus', 'Value': 'Used'}
-                    ],
-                    MaxResults=10
-                )
-                
-                if response['PriceList']:
-                    price_data = json.loads(response['PriceList'][0])
+            for page in pages:
+                for price_item in page['PriceList']:
+                    price_data = json_loads(price_item)
+                    attributes = price_data.get('product', {}).get('attributes', {})
+                    instance_type = attributes.get('instanceType')
                     
-                    # On-Demand料金を抽出
-                    terms = price_data.get('terms', {})
-                    on_demand = terms.get('OnDemand', {})
+                    if instance_type not in instance_types:
+                        continue
+                    # 料金を取得済みのインスタンスタイプは最初の結果を優先
+                    if instance_type in pricing_data and "error" not in pricing_data[instance_type]:
+                        continue
                     
-                    if on_demand:
-                        # 最初のOn-Demand料金を取得
-                        first_term = list(on_demand.values())[0]
-                        price_dimensions = first_term.get('priceDimensions', {})
-                        
-                        if price_dimensions:
-                            first_dimension = list(price_dimensions.values())[0]
-                            price_per_unit = first_dimension.get('pricePerUnit', {})
-                            usd_price = float(price_per_unit.get('USD', '0'))
-                            
-                            # インスタンス情報も取得
-                            attributes = price_data.get('product', {}).get('attributes', {})
-                            vcpu = attributes.get('vcpu', 'N/A')
-                            memory = attributes.get('memory', 'N/A')
-                            
-                            pricing_data[instance_type] = {
-                                "price_per_hour": usd_price,
-                                "vcpu": vcpu,
-                                "memory": memory,
-                                "region": self.region
-                            }
-                            
-                            print(f"   ✅ ${usd_price:.4f}/hour (vCPU: {vcpu}, Memory: {memory})")
-                        else:
-                            print(f"   ⚠️  料金情報なし")
-                            pricing_data[instance_type] = {
-                                "price_per_hour": 0.0,
-                                "vcpu": "N/A",
-                                "memory": "N/A",
-                                "region": self.region,
-                                "error": "No price dimensions found"
-                            }
-                else:
-                    print(f"   ⚠️  該当する料金プランなし")
-                    pricing_data[instance_type] = {
-                        "price_per_hour": 0.0,
-                        "vcpu": "N/A", 
-                        "memory": "N/A",
-                        "region": self.region,
-                        "error": "No matching price found"
-                    }
-                
-                # API制限を避けるため少し待機
-                time.sleep(0.1)
+                    instance_pricing = self._parse_price_item(price_data)
+                    pricing_data[instance_type] = instance_pricing
+                    
+                    if "error" not in instance_pricing:
+                        # 1件ごとの進捗はDEBUGのみ（標準出力への書き込みを減らす）
+                        logger.debug("📊 (%d/%d) %s: ✅ $%.4f/hour (vCPU: %s, Memory: %s)",
+                                     len(pricing_data), len(instance_types), instance_type,
+                                     instance_pricing['price_per_hour'], instance_pricing['vcpu'], instance_pricing['memory'])
                 
-            except Exception as e:
-                print(f"   ❌ エラー: {e}")
-                pricing_data[instance_type] = {
-                    "price_per_hour": 0.0,
-                    "vcpu": "N/A",
-                    "memory": "N/A", 
-                    "region": self.region,
-                    "error": str(e)
-                }
-        
-        return pricing_data
+        except Exception as e:
+            logger.error("   ❌ エラー: %s", e)
+            missing_error = str(e)
+        
+        # 取得できなかったインスタンスタイプ
+        missing_types = sorted(instance_types - pricing_data.keys())
+        if missing_types:
+            logger.warning("   ⚠️  該当する料金プランなし (%d件): %s", len(missing_types), ", ".join(missing_types))
+        for instance_type in missing_types:
+            pricing_data[instance_type] = {
+                "price_per_hour": 0.0,
+                "vcpu": "N/A",
+                "memory": "N/A",
+                "region": self.region,
+                "error": missing_error
+            }
+        
+        successful = sum(1 for v in pricing_data.values() if "error" not in v)
+        logger.info("📊 料金取得: %d/%d 成功", successful, len(instance_types))
+        
+        # 取得順ではなくインスタンスタイプ順で返す
+        return {instance_type: pricing_data[instance_type] for instance_type in sorted(pricing_data)}
+    
+    def _parse_price_item(self, price_data: Dict) -> Dict[str, float]:
+        """
+        PriceListの1件からOn-Demand料金とスペック情報を抽出
+        
+        Args:
+            price_data: パース済みのPriceList要素
+            
+        Returns:
+            料金情報辞書（料金が無い場合は"error"キー付き）
+        """
+        # On-Demand料金を抽出
+        terms = price_data.get('terms', {})
+        on_demand = terms.get('OnDemand', {})
+        
+        price_dimensions = {}
+        if on_demand:
+            # 最初のOn-Demand料金を取得
+            first_term = next(iter(on_demand.values()))
+            price_dimensions = first_term.get('priceDimensions', {})
+        
+        if not price_dimensions:
+            return {
+                "price_per_hour": 0.0,
+                "vcpu": "N/A",
+                "memory": "N/A",
+                "region": self.region,
+                "error": "No price dimensions found"
+            }
+        
+        first_dimension = next(iter(price_dimensions.values()))
+        price_per_unit = first_dimension.get('pricePerUnit', {})
+        usd_price = float(price_per_unit.get('USD', '0'))
+        
+        # インスタンス情報も取得
+        attributes = price_data.get('product', {}).get('attributes', {})
+        
+        return {
+            "price_per_hour": usd_price,
+            "vcpu": attributes.get('vcpu', 'N/A'),
+            "memory": attributes.get('memory', 'N/A'),
+            "region": self.region
+        }
     
     def save_pricing_data(self, pricing_data: Dict, output_file: str):
         """
@@ -193,10 +230,11 @@ class EC2PricingFetcher:
         
         try:
             # 出力ディレクトリを作成
-            Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+            output_path = Path(output_file)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(output_file, 'w') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
+            # 一括シリアライズして1回の書き込みで保存
+            output_path.write_bytes(json_dumps_bytes(output_data))
             
             print(f"✅ 保存完了!")
             print(f"📊 統計: {successful_instances}/{total_instances} 成功 ({(successful_instances/total_instances*100):.1f}%)")
@@ -206,6 +244,7 @@ class EC2PricingFetcher:
 
 def main():
     """メイン実行関数"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("🚀 AWS EC2料金取得スクリプト開始")
     print("=" * 50)
     
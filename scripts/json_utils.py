@@ -0,0 +1,32 @@
+"""
+スクリプト共通のJSON読み書き
+orjsonが利用可能なら使用し、無い環境では標準のjsonで同じ結果になるように代替する
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjsonが無い環境では標準のjsonで読み書きする
+    orjson = None
+
+# Excelやメモ帳で保存したJSONの先頭に付くUTF-8 BOM
+UTF8_BOM = b"\xef\xbb\xbf"
+
+def strip_bom(raw):
+    """先頭のBOMを除去（文字列/バイト列どちらも可）"""
+    if isinstance(raw, bytes):
+        return raw.removeprefix(UTF8_BOM)
+    return raw.removeprefix("\ufeff")
+
+def json_loads(raw):
+    """JSONをパース（文字列/バイト列どちらも可、orjsonはBOMを受け付けないので先に除去）"""
+    raw = strip_bom(raw)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def json_dumps_bytes(data) -> bytes:
+    """インデント付きJSONをUTF-8のバイト列で返す（標準のjsonでもorjsonと同じく日本語をエスケープしない）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
@@ -1,37 +1,47 @@
-import json
+import os
 import requests
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 from databricks.sdk import WorkspaceClient
 import boto3
+from botocore.config import Config
+
+from json_utils import json_loads, json_dumps_bytes, strip_bom
+
+def write_bytes_atomic(path: Path, data: bytes):
+    """一時ファイルに書き込んでから置き換える（書き込み途中のファイルを読まれないようにする）"""
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
 
 class PricingDataUpdater:
     """料金データの取得・更新を管理するクラス"""
     
-    def __init__(self):
-        self.data_path = Path(__file__).parent.parent / "data"
+    def __init__(self, data_path: Optional[Path] = None):
+        # 保存先を省略した場合はリポジトリのdataディレクトリを使用
+        self.data_path = Path(data_path) if data_path is not None else Path(__file__).parent.parent / "data"
         self.last_update_file = self.data_path / "last_update.json"
+        # 最終更新情報はメモリ上で保持し、更新のたびにファイルを読み直さない
+        self._last_update = self.get_last_update_info()
         
     def get_last_update_info(self) -> Dict[str, Any]:
         """最終更新情報を取得"""
         try:
             if self.last_update_file.exists():
-                with open(self.last_update_file, 'r') as f:
-                    return json.load(f)
+                return json_loads(self.last_update_file.read_bytes())
         except:
             pass
         return {"databricks": None, "ec2": None}
     
     def save_update_info(self, source: str):
         """更新情報を保存"""
-        update_info = self.get_last_update_info()
-        update_info[source] = datetime.now().isoformat()
+        self._last_update[source] = datetime.now().isoformat()
         
-        with open(self.last_update_file, 'w') as f:
-            json.dump(update_info, f, indent=2)
+        write_bytes_atomic(self.last_update_file, json_dumps_bytes(self._last_update))
     
     def fetch_databricks_pricing(self) -> Optional[Dict[str, Any]]:
         """Databricks Pricing APIから料金データを取得"""
@@ -82,74 +92,47 @@ class PricingDataUpdater:
             st.error(f"Databricks料金データの取得に失敗: {str(e)}")
             return None
     
-    def fetch_ec2_pricing(self) -> Optional[Dict[str, Any]]:
+    def fetch_ec2_pricing(self, max_workers: int = 8) -> Optional[Dict[str, Any]]:
         """AWS Pricing APIからEC2料金データを取得"""
         try:
             # AWS Pricing APIクライアントを作成
             # 注意: us-east-1リージョンでのみPricing APIが利用可能
-            pricing_client = boto3.client('pricing', region_name='us-east-1')
+            # 並列リクエスト時のスロットリングはadaptiveリトライで吸収する
+            pricing_client = boto3.client(
+                'pricing',
+                region_name='us-east-1',
+                config=Config(retries={"mode": "adaptive", "max_attempts": 10})
+            )
             
             instance_types = ["m5.large", "m5.xlarge", "m5.2xlarge", "r5.large", "r5.xlarge", "c5.large", "c5.xlarge"]
             regions = ["us-east-1", "us-west-2", "ap-northeast-1", "eu-west-1"]
             
-            pricing_data = {}
+            # APIリクエストはネットワーク待ちが大半なのでスレッドで並列実行する
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    (instance_type, region): executor.submit(self._fetch_ec2_price, pricing_client, instance_type, region)
+                    for instance_type in instance_types
+                    for region in regions
+                }
             
-            for instance_type in instance_types:
-                pricing_data[instance_type] = {}
+            # 結果の反映と警告表示はメインスレッドで行う（ワーカースレッドからのst.warningは表示されない）
+            pricing_data = {instance_type: {} for instance_type in instance_types}
+            current_data = None  # フォールバック用の現在の料金データ（必要になった時点で1回だけ読み込む）
+            for (instance_type, region), future in futures.items():
+                try:
+                    price_per_hour = future.result()
+                except Exception as e:
+                    st.warning(f"EC2料金取得エラー ({instance_type}, {region}): {str(e)}")
+                    price_per_hour = None
                 
-                for region in regions:
-                    try:
-                        # AWS Pricing APIでEC2料金を取得
-                        response = pricing_client.get_products(
-                            ServiceCode='AmazonEC2',
-                            Filters=[
-                                {
-                                    'Type': 'TERM_MATCH',
-                                    'Field': 'instanceType',
-                                    'Value': instance_type
-                                },
-                                {
-                                    'Type': 'TERM_MATCH',
-                                    'Field': 'location',
-                                    'Value': self._get_aws_location_name(region)
-                                },
-                                {
-                                    'Type': 'TERM_MATCH',
-                                    'Field': 'tenancy',
-                                    'Value': 'Shared'
-                                },
-                                {
-                                    'Type': 'TERM_MATCH',
-                                    'Field': 'operatingSystem',
-                                    'Value': 'Linux'
-                                }
-                            ]
-                        )
-                        
-                        if response['PriceList']:
-                            price_item = json.loads(response['PriceList'][0])
-                            terms = price_item['terms']['OnDemand']
-                            
-                            for term_key in terms:
-                                price_dimensions = terms[term_key]['priceDimensions']
-                                for pd_key in price_dimensions:
-                                    price_per_hour = float(price_dimensions[pd_key]['pricePerUnit']['USD'])
-                                    pricing_data[instance_type][region] = {
-                                        "price_per_hour": price_per_hour
-                                    }
-                                    break
-                                break
-                        else:
-                            # APIで取得できない場合は、デフォルト値を使用
-                            pricing_data[instance_type][region] = {
-                                "price_per_hour": self._get_default_ec2_price(instance_type, region)
-                            }
-                            
-                    except Exception as e:
-                        st.warning(f"EC2料金取得エラー ({instance_type}, {region}): {str(e)}")
-                        pricing_data[instance_type][region] = {
-                            "price_per_hour": self._get_default_ec2_price(instance_type, region)
-                        }
+                if price_per_hour is None:
+                    # APIで取得できない場合は、デフォルト値を使用
+                    if current_data is None:
+                        current_data = self._load_current_ec2_pricing()
+                    price_per_hour = self._get_default_ec2_price(instance_type, region, current_data)
+                pricing_data[instance_type][region] = {
+                    "price_per_hour": price_per_hour
+                }
             
             return pricing_data
             
@@ -157,6 +140,50 @@ class PricingDataUpdater:
             st.error(f"AWS EC2料金データの取得に失敗: {str(e)}")
             return None
     
+    def _fetch_ec2_price(self, pricing_client, instance_type: str, region: str) -> Optional[float]:
+        """1インスタンスタイプ・1リージョン分のOn-Demand時間単価を取得（該当なしはNone）"""
+        # AWS Pricing APIでEC2料金を取得
+        response = pricing_client.get_products(
+            ServiceCode='AmazonEC2',
+            Filters=[
+                {
+                    'Type': 'TERM_MATCH',
+                    'Field': 'instanceType',
+                    'Value': instance_type
+                },
+                {
+                    'Type': 'TERM_MATCH',
+                    'Field': 'location',
+                    'Value': self._get_aws_location_name(region)
+                },
+                {
+                    'Type': 'TERM_MATCH',
+                    'Field': 'tenancy',
+                    'Value': 'Shared'
+                },
+                {
+                    'Type': 'TERM_MATCH',
+                    'Field': 'operatingSystem',
+                    'Value': 'Linux'
+                }
+            ]
+        )
+        
+        if not response['PriceList']:
+            return None
+        
+        price_item = json_loads(response['PriceList'][0])
+        terms = price_item['terms']['OnDemand']
+        
+        # 最初のOn-Demand料金を使用
+        first_term = next(iter(terms.values()), None)
+        if first_term is None:
+            return None
+        first_dimension = next(iter(first_term['priceDimensions'].values()), None)
+        if first_dimension is None:
+            return None
+        return float(first_dimension['pricePerUnit']['USD'])
+    
     def _get_aws_location_name(self, region: str) -> str:
         """AWSリージョンコードをLocation名に変換"""
         location_mapping = {
@@ -167,13 +194,21 @@ class PricingDataUpdater:
         }
         return location_mapping.get(region, region)
     
-    def _get_default_ec2_price(self, instance_type: str, region: str) -> float:
+    def _load_current_ec2_pricing(self) -> Dict[str, Any]:
+        """現在のEC2料金データを読み込み（読み込めない場合は空）"""
+        try:
+            return json_loads((self.data_path / "ec2_pricing.json").read_bytes())
+        except:
+            return {}
+    
+    def _get_default_ec2_price(self, instance_type: str, region: str,
+                               current_data: Optional[Dict[str, Any]] = None) -> float:
         """デフォルトのEC2料金を取得（API取得失敗時のフォールバック）"""
-        # 現在の料金データから取得
+        # 現在の料金データから取得（呼び出し側で読み込み済みならそれを使う）
+        if current_data is None:
+            current_data = self._load_current_ec2_pricing()
         try:
-            with open(self.data_path / "ec2_pricing.json", 'r') as f:
-                current_data = json.load(f)
-                return current_data.get(instance_type, {}).get(region, {}).get("price_per_hour", 0.1)
+            return current_data.get(instance_type, {}).get(region, {}).get("price_per_hour", 0.1)
         except:
             return 0.1  # デフォルト値
     
@@ -181,8 +216,7 @@ class PricingDataUpdater:
         """Databricks料金データを更新"""
         new_data = self.fetch_databricks_pricing()
         if new_data:
-            with open(self.data_path / "databricks_pricing.json", 'w') as f:
-                json.dump(new_data, f, indent=2)
+            write_bytes_atomic(self.data_path / "databricks_pricing.json", json_dumps_bytes(new_data))
             self.save_update_info("databricks")
             return True
         return False
@@ -191,8 +225,7 @@ class PricingDataUpdater:
         """EC2料金データを更新"""
         new_data = self.fetch_ec2_pricing()
         if new_data:
-            with open(self.data_path / "ec2_pricing.json", 'w') as f:
-                json.dump(new_data, f, indent=2)
+            write_bytes_atomic(self.data_path / "ec2_pricing.json", json_dumps_bytes(new_data))
             self.save_update_info("ec2")
             return True
         return False
@@ -215,12 +248,13 @@ class PricingDataUpdater:
             else:
                 return False
             
-            # ファイル内容を検証
-            content = json.loads(uploaded_file.getvalue())
+            # ファイル内容を検証（不正なJSONなら例外）
+            # 先頭のBOMは除いて保存し、保存後のファイルもorjsonで読めるようにする
+            raw = strip_bom(uploaded_file.getvalue())
+            json_loads(raw)
             
-            # JSONファイルとして保存
-            with open(file_path, 'w') as f:
-                json.dump(content, f, indent=2)
+            # 検証済みのアップロード内容をそのまま保存（再シリアライズしない）
+            write_bytes_atomic(file_path, raw)
             
             self.save_update_info(data_type)
             return True
@@ -2,9 +2,64 @@ import streamlit as st
 import pandas as pd
 import json
 from pathlib import Path
-import re
 import io
 from datetime import datetime
+import textwrap
+
+try:
+    import orjson
+except ImportError:  # orjsonが無い環境では標準のjsonで読み込む
+    orjson = None
+
+# sql_warehouse_sizes.jsonが無い場合のSQL Warehouseサイズ選択肢
+DEFAULT_SQL_WAREHOUSE_SIZES = ("2X-Small", "X-Small", "Small", "Medium", "Large")
+
+# SQL WarehouseのDBU単価（固定値として$1.0を仮定、実際の値に応じて調整）
+SQL_WAREHOUSE_DBU_PRICE = 1.0
+
+# フォームから作成するワークロード設定の固定項目
+_CLUSTER_CONFIG_DEFAULTS = {
+    "sql_warehouse_size": "",
+    "sql_warehouse_clusters": 1,
+}
+_SQL_WAREHOUSE_CONFIG_DEFAULTS = {
+    "workload_type": "sql-warehouse-serverless",
+    "driver_instance": "",
+    "executor_instance": "",
+    "executor_nodes": 0,
+    "photon_enabled": False,
+}
+
+# 料金データに存在しないインスタンスの(DBU/h, $/h)
+_NO_RATE = (0, 0)
+
+# SQL Warehouse結果で常に固定値となるクラスター用項目（呼び出しごとに組み立てない）
+_SQL_WAREHOUSE_FIXED_FIELDS = {
+    "driver_instance": "",
+    "executor_instance": "",
+    "actual_executor_instance": "",
+    "executor_nodes": 0,
+    "photon_enabled": False,
+    "driver_dbu": 0,
+    "ec2_monthly": 0,  # SQL WarehouseはServerlessなのでEC2料金なし
+}
+
+# (ワークロードタイプ, Photon有効) → 料金データのワークロードキー
+_WORKLOAD_KEY = {
+    ("all-purpose", False): "all-purpose",
+    ("all-purpose", True): "all-purpose-photon",
+    ("jobs", False): "jobs",
+    ("jobs", True): "jobs-photon",
+    ("dlt-advanced", False): "dlt-advanced",
+    ("dlt-advanced", True): "dlt-advanced-photon",
+}
+
+# インスタンスサイズ表記の並び順（natural_sort_key用）
+_SIZE_ORDER = {
+    'nano': 0.1, 'micro': 0.2, 'small': 0.3, 'medium': 0.4, 'large': 1,
+    'xlarge': 2, '2xlarge': 3, '4xlarge': 4, '8xlarge': 5, '12xlarge': 6,
+    '16xlarge': 7, '24xlarge': 8, '32xlarge': 9, '48xlarge': 10, 'metal': 100
+}
 
 def natural_sort_key(instance_type: str):
     """インスタンスタイプを自然な順序でソートするためのキー関数"""
@@ -13,50 +68,113 @@ def natural_sort_key(instance_type: str):
         return (instance_type, 0)
     
     family, size = parts
-    size_match = re.match(r'^(\d*)(.*)$', size)
-    if size_match:
-        num_str, size_suffix = size_match.groups()
-        num = int(num_str) if num_str else 0
-    else:
-        num = 0
-        size_suffix = size
-    
-    size_order = {
-        'nano': 0.1, 'micro': 0.2, 'small': 0.3, 'medium': 0.4, 'large': 1,
-        'xlarge': 2, '2xlarge': 3, '4xlarge': 4, '8xlarge': 5, '12xlarge': 6,
-        '16xlarge': 7, '24xlarge': 8, '32xlarge': 9, '48xlarge': 10, 'metal': 100
-    }
+    # サイズ表記を先頭の数字部分と残りに分割（例: "12xlarge" → 12, "xlarge"）
+    size_suffix = size.lstrip("0123456789")
+    num_str = size[:len(size) - len(size_suffix)]
+    num = int(num_str) if num_str else 0
     
     if num > 0 and size_suffix in ['xlarge']:
-        final_order = size_order.get('xlarge', 1) + num - 1
+        final_order = _SIZE_ORDER.get('xlarge', 1) + num - 1
     else:
-        final_order = size_order.get(size, 1)
+        final_order = _SIZE_ORDER.get(size, 1)
     
     return (family, final_order, size)
 
+def build_rate_tables(databricks_data: dict, ec2_data: dict, sql_warehouse_data: dict) -> dict:
+    """計算用のフラットな単価テーブルを作成（計算時の多段.get()を1回の参照にする）"""
+    region_data = databricks_data.get("enterprise", {}).get("aws", {}).get("ap-northeast-1", {})
+    return {
+        # (ワークロードキー, インスタンスタイプ) -> (DBU/h, $/h)
+        "databricks_rate": {
+            (workload_key, inst): (rates.get("dbu_per_hour", 0), rates.get("rate_per_hour", 0))
+            for workload_key, instances in region_data.items()
+            if isinstance(instances, dict)
+            for inst, rates in instances.items()
+        },
+        "ec2_price_per_hour": {
+            inst: spec.get("price_per_hour", 0) for inst, spec in ec2_data.items()
+        },
+        "sql_warehouse_dbu_per_hour": {
+            size: info.get("dbu_per_hour", 0) for size, info in sql_warehouse_data.items()
+        },
+    }
+
+def list_instance_types(databricks_data: dict) -> tuple:
+    """料金データに含まれる全インスタンスタイプを自然順でソートして返す"""
+    region_data = databricks_data["enterprise"]["aws"]["ap-northeast-1"]
+    instance_types = set()
+    for workload_data in region_data.values():
+        if isinstance(workload_data, dict):
+            instance_types.update(workload_data)
+    return tuple(sorted(instance_types, key=natural_sort_key))
+
+def build_instance_catalog(instance_types: tuple, ec2_data: dict) -> dict:
+    """インスタンス選択肢（スペック付き表示名）と表示名→インスタンスタイプの対応表を作成"""
+    # スペック付きインスタンスオプション作成
+    instance_options = tuple(format_instance_option(inst, ec2_data) for inst in instance_types)
+    instance_mapping = dict(zip(instance_options, instance_types))
+    option_by_instance = dict(zip(instance_types, instance_options))
+    
+    # Executorインスタンス用オプション（"Driverと同じ"を先頭に追加）
+    executor_options = ("Driverと同じ",) + instance_options
+    executor_mapping = {"Driverと同じ": "same_as_driver", **instance_mapping}
+    
+    return {
+        "instance_types": instance_types,
+        "instance_options": instance_options,
+        "instance_mapping": instance_mapping,
+        "option_by_instance": option_by_instance,  # 編集フォームで現在値の表示名を引くための逆引き
+        "executor_options": executor_options,
+        "executor_mapping": executor_mapping,
+        # 表示名 → selectboxのindex（編集フォームの初期選択用）
+        "instance_index": {opt: i for i, opt in enumerate(instance_options)},
+        "executor_index": {opt: i for i, opt in enumerate(executor_options)},
+        # 追加フォームのDriver初期値（r5.large）
+        "default_driver_index": next((i for i, opt in enumerate(instance_options) if "r5.large" in opt), 0),
+    }
+
+# Excelやメモ帳で保存したJSONの先頭に付くUTF-8 BOM（srcは単体でデプロイするためscripts/json_utilsは使えない）
+_UTF8_BOM = b"\xef\xbb\xbf"
+
+def _load_json(path: Path):
+    """JSONファイルを読み込み（orjsonが利用可能ならバイト列から直接パース、orjsonはBOMを受け付けないので先に除去）"""
+    raw = path.read_bytes().removeprefix(_UTF8_BOM)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+# 戻り値は読み取り専用として扱い、cache_dataのような呼び出しごとのコピー（pickle復元）を避ける
+@st.cache_resource(show_spinner=False)
+def _read_pricing_files():
+    """料金データファイルを読み込み（再実行ごとのJSONパースを避けるためキャッシュ）"""
+    base_path = Path(__file__).parent
+    data_path = base_path / "data"
+    
+    databricks_data = _load_json(data_path / "databricks_compute_pricing_updated.json")
+    ec2_data = _load_json(data_path / "ec2_pricing_tokyo.json")
+    
+    # SQL Warehouseサイズデータ読み込み
+    sql_warehouse_file = data_path / "sql_warehouse_sizes.json"
+    sql_warehouse_data = {}
+    if sql_warehouse_file.exists():
+        sql_warehouse_data = _load_json(sql_warehouse_file)
+    
+    ec2_pricing = ec2_data.get("pricing", {})
+    rate_tables = build_rate_tables(databricks_data, ec2_pricing, sql_warehouse_data)
+    # サイズ選択肢・インスタンス選択肢はデータ読み込み時に一度だけ作成
+    sql_warehouse_sizes = tuple(sql_warehouse_data) or DEFAULT_SQL_WAREHOUSE_SIZES
+    instance_catalog = build_instance_catalog(list_instance_types(databricks_data), ec2_pricing)
+    # EC2料金はrate_tables・instance_catalogに取り込み済みのため返さない
+    return databricks_data, sql_warehouse_sizes, rate_tables, instance_catalog
+
 def load_data():
     """データ読み込み"""
     try:
-        base_path = Path(__file__).parent
-        data_path = base_path / "data"
-        
-        with open(data_path / "databricks_compute_pricing_updated.json", "r") as f:
-            databricks_data = json.load(f)
-        
-        with open(data_path / "ec2_pricing_tokyo.json", "r") as f:
-            ec2_data = json.load(f)
-        
-        # SQL Warehouseサイズデータ読み込み
-        sql_warehouse_file = data_path / "sql_warehouse_sizes.json"
-        sql_warehouse_data = {}
-        if sql_warehouse_file.exists():
-            with open(sql_warehouse_file, "r") as f:
-                sql_warehouse_data = json.load(f)
-            
-        return databricks_data, ec2_data.get("pricing", {}), sql_warehouse_data
+        # 例外はキャッシュされないため、読み込み失敗時は次回の再実行で再試行される
+        return _read_pricing_files()
     except Exception as e:
         st.error(f"データ読み込みエラー: {e}")
-        return {}, {}, {}
+        return {}, DEFAULT_SQL_WAREHOUSE_SIZES, build_rate_tables({}, {}, {}), build_instance_catalog((), {})
 
 def format_instance_option(instance_type: str, ec2_data: dict) -> str:
     """インスタンスタイプにスペック情報を追加して表示"""
@@ -67,109 +185,645 @@ def format_instance_option(instance_type: str, ec2_data: dict) -> str:
     memory = spec_info.get("memory", "N/A")
     return f"{instance_type} ({vcpu} vCPU, {memory})"
 
-def calculate_workload_cost(config: dict, databricks_data: dict, ec2_data: dict, sql_warehouse_data: dict = None) -> dict:
+def _calculate_sql_warehouse_cost(config: dict, rate_tables: dict) -> dict:
+    """SQL Warehouse（Serverless）の料金を計算"""
+    sql_warehouse_dbu = rate_tables["sql_warehouse_dbu_per_hour"]
+    if not sql_warehouse_dbu:
+        st.error("SQL Warehouseデータが見つかりません")
+        return {}
+    
+    # SQL Warehouseサイズ別DBU消費量を取得
+    dbu_per_hour = sql_warehouse_dbu.get(config["sql_warehouse_size"], 0)
+    
+    # クラスタ数とサイズに基づく計算
+    total_dbu_per_hour = dbu_per_hour * config["sql_warehouse_clusters"]
+    total_dbu_monthly = total_dbu_per_hour * config["monthly_hours"]
+    
+    total_databricks_monthly = total_dbu_monthly * SQL_WAREHOUSE_DBU_PRICE
+    
+    return {
+        **_SQL_WAREHOUSE_FIXED_FIELDS,
+        "workload_name": config["workload_name"],
+        "workload_type": config["workload_type"],
+        "sql_warehouse_size": config["sql_warehouse_size"],
+        "sql_warehouse_clusters": config["sql_warehouse_clusters"],
+        "monthly_hours": config["monthly_hours"],
+        "daily_hours": config.get("daily_hours", 8),
+        "monthly_days": config.get("monthly_days", 20),
+        "executor_dbu": total_dbu_per_hour,
+        "total_dbu": total_dbu_monthly,
+        "databricks_monthly": total_databricks_monthly,
+        "total_monthly": total_databricks_monthly
+    }
+
+def _calculate_cluster_cost(config: dict, rate_tables: dict) -> dict:
+    """クラスター型ワークロードの料金を計算"""
+    # ワークロードキー決定（未登録の組み合わせはワークロードタイプをそのまま使う）
+    workload_type = config["workload_type"]
+    workload_key = _WORKLOAD_KEY.get((workload_type, config["photon_enabled"]), workload_type)
+    
+    # Executorインスタンスがdriverと同じ場合の処理
+    actual_executor_instance = config["executor_instance"]
+    if actual_executor_instance == "same_as_driver":
+        actual_executor_instance = config["driver_instance"]
+    
+    monthly_hours = config["monthly_hours"]
+    executor_nodes = config["executor_nodes"]
+    
+    # Driver / Executor単価
+    databricks_rate = rate_tables["databricks_rate"]
+    driver_dbu, driver_rate = databricks_rate.get((workload_key, config["driver_instance"]), _NO_RATE)
+    executor_dbu, executor_rate = databricks_rate.get((workload_key, actual_executor_instance), _NO_RATE)
+    
+    # 月間料金 = (Driver単価 + Executor単価 × ノード数) × 月間時間
+    ec2_price = rate_tables["ec2_price_per_hour"]
+    databricks_monthly = (driver_rate + executor_rate * executor_nodes) * monthly_hours
+    ec2_monthly = (ec2_price.get(config["driver_instance"], 0)
+                   + ec2_price.get(actual_executor_instance, 0) * executor_nodes) * monthly_hours
+    
+    return {
+        "workload_name": config["workload_name"],
+        "workload_type": workload_key,
+        "driver_instance": config["driver_instance"],
+        "executor_instance": config["executor_instance"],  # UI表示用（"same_as_driver"の場合もあり）
+        "actual_executor_instance": actual_executor_instance,  # 実際の計算用インスタンス
+        "executor_nodes": executor_nodes,
+        "photon_enabled": config["photon_enabled"],
+        "monthly_hours": monthly_hours,
+        "daily_hours": config.get("daily_hours", 8),
+        "monthly_days": config.get("monthly_days", 20),
+        "driver_dbu": driver_dbu,
+        "executor_dbu": executor_dbu,
+        "total_dbu": (driver_dbu + executor_dbu * executor_nodes) * monthly_hours,
+        "databricks_monthly": databricks_monthly,
+        "ec2_monthly": ec2_monthly,
+        "total_monthly": databricks_monthly + ec2_monthly,
+        "sql_warehouse_size": config.get("sql_warehouse_size", ""),
+        "sql_warehouse_clusters": config.get("sql_warehouse_clusters", 1)
+    }
+
+# ワークロードタイプ別の計算関数（未登録のタイプはクラスター型として計算）
+_COST_HANDLERS = {
+    "sql-warehouse-serverless": _calculate_sql_warehouse_cost,
+}
+
+def _display_fields(result: dict) -> dict:
+    """出力・計算式表示で使う表示用の値（ワークロード追加時に1回だけ作成）"""
+    executor_display = ""  # SQL Warehouseは表示なし
+    if result["actual_executor_instance"]:
+        executor_display = f"{result['actual_executor_instance']} ×{result['executor_nodes']}"
+        if result["executor_instance"] == "same_as_driver":
+            executor_display += " (Driverと同じ)"
+    return {
+        "hours_label": f"{result['monthly_hours']}時間 ({result['daily_hours']}時間/日 × {result['monthly_days']}日)",
+        "executor_display": executor_display,
+        "photon_status": "有効" if result["photon_enabled"] else "無効",
+        "photon_mark": " ⚡" if result["photon_enabled"] else "",
+        "dbu_unit_price": result["databricks_monthly"] / result["total_dbu"] if result["total_dbu"] > 0 else 0,
+    }
+
+def calculate_workload_cost(config: dict, rate_tables: dict) -> dict:
     """ワークロードの料金を計算"""
     try:
-        # SQL Warehouseの場合
-        if config["workload_type"] == "sql-warehouse-serverless":
-            if not sql_warehouse_data:
-                st.error("SQL Warehouseデータが見つかりません")
-                return {}
+        handler = _COST_HANDLERS.get(config["workload_type"], _calculate_cluster_cost)
+        result = handler(config, rate_tables)
+        result.update(_display_fields(result))
+        return result
+    except Exception as e:
+        st.error(f"計算エラー: {e}")
+        return {}
+
+def build_export_df(workloads: list) -> pd.DataFrame:
+    """Excel/CSV出力用の詳細データを作成"""
+    export_data = []
+    for w in workloads:
+        # SQL Warehouseの場合とクラスターの場合で分岐
+        if w["workload_type"] == "sql-warehouse-serverless":
+            # SQL Warehouse用のエクスポートデータ
+            export_data.append({
+                "ワークロード名": w['workload_name'],
+                "ワークロードタイプ": w['workload_type'],
+                "SQL Warehouseサイズ": w.get('sql_warehouse_size', ''),
+                "クラスタ数": w.get('sql_warehouse_clusters', 1),
+                "月間利用時間": w['hours_label'],
+                "DBU/h": f"{w['executor_dbu']:.2f}",
+                "月間総DBU": f"{w['total_dbu']:.0f}",
+                "DBU単価": f"${w['dbu_unit_price']:.3f}",
+                "Databricks料金(月)": f"${w['databricks_monthly']:,.2f}",
+                "EC2料金(月)": f"${w['ec2_monthly']:,.2f}",
+                "合計料金(月)": f"${w['total_monthly']:,.2f}"
+            })
+        else:
+            # クラスター型ワークロード用のエクスポートデータ
+            export_data.append({
+                "ワークロード名": w['workload_name'],
+                "ワークロードタイプ": w['workload_type'],
+                "Photon": w['photon_status'],
+                "Driverインスタンス": w['driver_instance'],
+                "Executorインスタンス": w['executor_display'],
+                "月間利用時間": w['hours_label'],
+                "Driver DBU/h": f"{w['driver_dbu']:.2f}",
+                "Executor DBU/h": f"{w['executor_dbu']:.2f}",
+                "月間総DBU": f"{w['total_dbu']:.0f}",
+                "DBU単価": f"${w['dbu_unit_price']:.3f}",
+                "Databricks料金(月)": f"${w['databricks_monthly']:,.2f}",
+                "EC2料金(月)": f"${w['ec2_monthly']:,.2f}",
+                "合計料金(月)": f"${w['total_monthly']:,.2f}"
+            })
+    
+    return pd.DataFrame(export_data)
+
+def build_workload_summary(results_df: pd.DataFrame) -> pd.DataFrame:
+    """ワークロード明細テーブル用のDataFrameを作成"""
+    # results_dfから列単位で組み立てる（SQL Warehouse / クラスター型で不要な列は欠損値）
+    is_sql = results_df["workload_type"] == "sql-warehouse-serverless"
+    is_cluster = ~is_sql
+    return pd.DataFrame({
+        "ワークロード名": results_df["workload_name"] + results_df["photon_mark"].where(is_cluster, ""),
+        "タイプ": results_df["workload_type"],
+        "Driver": results_df["driver_instance"].where(is_cluster),
+        "Executor": (results_df["actual_executor_instance"] + " ×" + results_df["executor_nodes"].astype(str)).where(is_cluster),
+        "サイズ": results_df["sql_warehouse_size"].where(is_sql),
+        "クラスタ数": ("×" + results_df["sql_warehouse_clusters"].astype(str)).where(is_sql),
+        "月間時間": (results_df["monthly_hours"].astype(str) + "h ("
+             + results_df["daily_hours"].astype(str) + "h/日×"
+             + results_df["monthly_days"].astype(str) + "日)"),
+        "Databricks": results_df["databricks_monthly"],
+        "EC2": results_df["ec2_monthly"],
+        "合計": results_df["total_monthly"],
+    }).dropna(axis=1, how="all")
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def summarize_workloads(workloads: list):
+    """ワークロード一覧の合計値・出力用データ・明細テーブルを返す（同じ一覧なら再計算しない）"""
+    results_df = pd.DataFrame(workloads)
+    totals = results_df[["databricks_monthly", "ec2_monthly", "total_dbu"]].sum()
+    # Excel/CSV用の詳細データと明細テーブルも一覧が変わった時だけ作成する
+    export_df = build_export_df(workloads)
+    workload_summary = build_workload_summary(results_df)
+    # results_df自体は返さない（キャッシュヒットのたびに使わないDataFrameを複製しないため）
+    return totals, export_df, workload_summary
+
+def usage_hours_inputs(daily_value: int = 8, monthly_days_value: int = 20, key_prefix: str = None):
+    """1日あたりの利用時間・月間利用日数の入力欄を表示し、入力値を返す"""
+    daily_hours = st.number_input("1日あたりの利用時間", min_value=1, max_value=24, value=daily_value,
+                                  key=f"{key_prefix}daily" if key_prefix else None)
+    monthly_days = st.number_input("月間利用日数", min_value=1, max_value=31, value=monthly_days_value,
+                                   key=f"{key_prefix}monthly_days" if key_prefix else None)
+    return daily_hours, monthly_days
+
+def show_monthly_hours(daily_hours: int, monthly_days: int) -> int:
+    """月間利用時間を自動計算して表示"""
+    monthly_hours = daily_hours * monthly_days
+    st.info(f"📅 月間利用時間: {monthly_hours}時間 ({daily_hours}時間/日 × {monthly_days}日)")
+    return monthly_hours
+
+@st.fragment
+def export_section(export_df: pd.DataFrame, totals: dict):
+    """データ出力（Excel/CSV）を表示（ボタン操作時はこのセクションだけ再実行）"""
+    total_databricks = totals["databricks_monthly"]
+    total_ec2 = totals["ec2_monthly"]
+    total_dbu = totals["total_dbu"]
+    grand_total = total_databricks + total_ec2
+    
+    st.subheader("📊 データ出力")
+    col_export1, col_export2 = st.columns(2)
+    
+    with col_export1:
+        if st.button("📊 Excel形式でダウンロード", type="secondary"):
+            # Excel出力
+            excel_buffer = io.BytesIO()
+            # xlsxwriterは書き込み専用で高速（pandasは列順にセルを書くためconstant_memoryは使えない）
+            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+                export_df.to_excel(writer, sheet_name='Databricks料金計算結果', index=False)
+                
+                # サマリー情報も追加
+                summary_df = pd.DataFrame({
+                    "項目": ["Databricks月間合計", "EC2月間合計", "総月間料金", "総DBU消費量"],
+                    "金額・数量": [f"${total_databricks:,.2f}", f"${total_ec2:,.2f}", f"${grand_total:,.2f}", f"{total_dbu:,.0f} DBU"]
+                })
+                summary_df.to_excel(writer, sheet_name='サマリー', index=False)
             
-            # SQL Warehouseサイズ別DBU消費量を取得
-            size_info = sql_warehouse_data.get(config["sql_warehouse_size"], {})
-            dbu_per_hour = size_info.get("dbu_per_hour", 0)
+            excel_buffer.seek(0)
             
-            # クラスタ数とサイズに基づく計算
-            total_dbu_per_hour = dbu_per_hour * config["sql_warehouse_clusters"]
-            total_dbu_monthly = total_dbu_per_hour * config["monthly_hours"]
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             
-            # DBU単価（固定値として$1.0を仮定、実際の値に応じて調整）
-            dbu_price = 1.0
-            total_databricks_monthly = total_dbu_monthly * dbu_price
+            st.download_button(
+                label="📊 Excelファイルをダウンロード",
+                data=excel_buffer.getvalue(),
+                file_name=f"databricks_料金計算_{timestamp}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+    
+    with col_export2:
+        # CSV出力（download_buttonにはデータを先に渡す必要があるため、バッファを介さず文字列で生成）
+        csv_data = export_df.to_csv(index=False, encoding='utf-8-sig')
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        st.download_button(
+            label="📄 CSVファイルをダウンロード",
+            data=csv_data,
+            file_name=f"databricks_料金計算_{timestamp}.csv",
+            mime="text/csv"
+        )
+
+@st.fragment
+def render_results(rate_tables: dict):
+    """料金計算結果パネルを表示"""
+    st.header("📊 料金計算結果")
+    
+    if not st.session_state.workloads:
+        st.info("サイドバーでワークロードを設定・追加してください")
+    else:
+        # 合計計算（ワークロード一覧をDataFrame化して1回で集計）
+        totals, export_df, workload_summary = summarize_workloads(st.session_state.workloads)
+        total_databricks = totals["databricks_monthly"]
+        total_ec2 = totals["ec2_monthly"]
+        total_dbu = totals["total_dbu"]
+        grand_total = total_databricks + total_ec2
+        
+        # サマリーメトリクス
+        col_m1, col_m2, col_m3 = st.columns(3)
+        with col_m1:
+            st.metric("Databricks月間", f"${total_databricks:,.2f}")
+        with col_m2:
+            st.metric("EC2月間", f"${total_ec2:,.2f}")
+        with col_m3:
+            st.metric("月間合計", f"${grand_total:,.2f}")
+        
+        # スプレッドシート出力機能
+        export_section(export_df, totals)
+        
+        # ワークロード明細テーブル
+        st.subheader("📋 ワークロード明細")
+        
+        # 金額列は数値のままArrowで送り、表示形式はcolumn_configで指定する（ブラウザ側でソート可能）
+        st.dataframe(
+            workload_summary,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                # "dollar"プリセット + step=1で"$1,280"のように桁区切り付き・小数なしで表示
+                column: st.column_config.NumberColumn(format="dollar", step=1)
+                for column in ("Databricks", "EC2", "合計")
+            },
+        )
+        
+        # 詳細分析
+        with st.expander("🔍 詳細分析"):
+            # 1回のmarkdown描画にまとめる（行ごとのst.writeを避ける）
+            detail_blocks = [
+                f"**総DBU消費量:** {total_dbu:,.0f} DBU/月",
+                f"**実効DBU単価:** ${total_databricks/total_dbu:.3f}/DBU" if total_dbu > 0 else "DBU単価計算不可",
+            ]
+            
+            # 個別ワークロード詳細
+            for w in st.session_state.workloads:
+                if w["workload_type"] == "sql-warehouse-serverless":
+                    # SQL Warehouse用の詳細表示
+                    detail_lines = [
+                        f"- SQL Warehouseサイズ: {w.get('sql_warehouse_size', '')}, クラスタ数: {w.get('sql_warehouse_clusters', 1)}",
+                        f"- DBU消費量: {w['executor_dbu']:.2f}/h per cluster",
+                        f"- 月間DBU: {w['total_dbu']:,.0f} DBU",
+                    ]
+                else:
+                    # クラスター型ワークロード用の詳細表示
+                    detail_lines = [
+                        f"- Driver DBU: {w['driver_dbu']:.2f}/h, Executor DBU: {w['executor_dbu']:.2f}/h",
+                        f"- 月間DBU: {w['total_dbu']:,.0f} DBU",
+                    ]
+                detail_blocks.append(f"**{w['workload_name']}:**\n\n" + "\n".join(detail_lines))
+            
+            st.markdown("\n\n".join(detail_blocks))
+        
+        # 計算式表示（fragmentのため、このセクションの再実行では他の表示を再描画しない）
+        formula_details(rate_tables)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_formula_md(workloads: list, _ec2_price_per_hour: dict) -> str:
+    """個別ワークロードの計算式Markdownを作成（同じ一覧なら再作成しない）"""
+    # EC2単価はキャッシュ済みの料金データなのでキャッシュキーには含めない
+    blocks = []
+    for w in workloads:
+        if w["workload_type"] == "sql-warehouse-serverless":
+            # SQL Warehouse用の計算式
+            blocks.append(f"### 📋 {w['workload_name']} (SQL Warehouse)\n" + textwrap.dedent(f"""
+            **🏢 SQL Warehouse構成:**
+            - サイズ: {w.get('sql_warehouse_size', '')}
+            - クラスタ数: {w.get('sql_warehouse_clusters', 1)}
+            - 月間稼働時間: {w['hours_label']}
+
+            **💎 Databricks料金計算:**
+            ```
+            SQL Warehouse DBU: {w['executor_dbu']:.2f} DBU/h per cluster
+            総DBU消費量: {w['executor_dbu']:.2f} DBU/h × {w.get('sql_warehouse_clusters', 1)}クラスタ × {w['monthly_hours']}h = {w['total_dbu']:.0f} DBU
+            DBU単価: ${w['dbu_unit_price']:.3f}/DBU
+            Databricks料金: {w['total_dbu']:.0f} DBU × ${w['dbu_unit_price']:.3f}/DBU = ${w['databricks_monthly']:,.2f}
+            ```
+
+            **🔧 EC2料金:**
+            ```
+            EC2料金: $0.00 (Serverlessのため)
+            ```
+
+            **💰 総合計:**
+            ```
+            ${w['databricks_monthly']:,.2f} (Databricks) + $0.00 (EC2) = ${w['total_monthly']:,.2f}
+            ```
+            """))
+        else:
+            # クラスター型ワークロード用の計算式
+            photon_note = " (Photon有効)" if w['photon_enabled'] else ""
+            
+            # EC2料金情報を取得
+            driver_ec2_rate = _ec2_price_per_hour.get(w['driver_instance'], 0)
+            executor_ec2_rate = _ec2_price_per_hour.get(w['actual_executor_instance'], 0)
             
-            return {
-                "workload_name": config["workload_name"],
-                "workload_type": config["workload_type"],
-                "sql_warehouse_size": config["sql_warehouse_size"],
-                "sql_warehouse_clusters": config["sql_warehouse_clusters"],
-                "driver_instance": "",
-                "executor_instance": "",
-                "actual_executor_instance": "",
-                "executor_nodes": 0,
-                "photon_enabled": False,
-                "monthly_hours": config["monthly_hours"],
-                "daily_hours": config.get("daily_hours", 8),
-                "monthly_days": config.get("monthly_days", 20),
-                "driver_dbu": 0,
-                "executor_dbu": total_dbu_per_hour,
-                "total_dbu": total_dbu_monthly,
-                "databricks_monthly": total_databricks_monthly,
-                "ec2_monthly": 0,  # SQL WarehouseはServerlessなのでEC2料金なし
-                "total_monthly": total_databricks_monthly
+            blocks.append(f"### 📋 {w['workload_name']}{photon_note}\n" + textwrap.dedent(f"""
+            **🖥️ インスタンス構成:**
+            - Driver: {w['driver_instance']} × 1ノード
+            - Executor: {w['actual_executor_instance']} × {w['executor_nodes']}ノード{' (Driverと同じ)' if w['executor_instance'] == 'same_as_driver' else ''}
+            - 月間稼働時間: {w['hours_label']}
+
+            **💎 Databricks料金計算:**
+            ```
+            Driver:  {w['driver_dbu']:.2f} DBU/h × 1ノード × {w['monthly_hours']}h = {w['driver_dbu'] * w['monthly_hours']:.0f} DBU
+            Executor: {w['executor_dbu']:.2f} DBU/h × {w['executor_nodes']}ノード × {w['monthly_hours']}h = {w['executor_dbu'] * w['executor_nodes'] * w['monthly_hours']:.0f} DBU
+            合計DBU: {w['total_dbu']:.0f} DBU
+            DBU単価: {w['dbu_unit_price']:.3f}$/DBU
+            Databricks料金: {w['total_dbu']:.0f} DBU × {w['dbu_unit_price']:.3f}$/DBU = ${w['databricks_monthly']:,.2f}
+            ```
+
+            **🔧 EC2料金計算:**
+            ```
+            Driver EC2:  ${driver_ec2_rate:.4f}/h × 1ノード × {w['monthly_hours']}h = ${driver_ec2_rate * w['monthly_hours']:,.2f}
+            Executor EC2: ${executor_ec2_rate:.4f}/h × {w['executor_nodes']}ノード × {w['monthly_hours']}h = ${executor_ec2_rate * w['executor_nodes'] * w['monthly_hours']:,.2f}
+            EC2合計: ${w['ec2_monthly']:,.2f}
+            ```
+
+            **💰 総合計:**
+            ```
+            ${w['databricks_monthly']:,.2f} (Databricks) + ${w['ec2_monthly']:,.2f} (EC2) = ${w['total_monthly']:,.2f}
+            ```
+            """))
+    
+    return "\n\n---\n\n".join(blocks)
+
+@st.fragment
+def formula_details(rate_tables: dict):
+    """計算式の詳細を表示"""
+    with st.expander("📐 計算式の詳細"):
+        st.markdown("### 💡 料金計算の仕組み")
+        st.markdown("""
+        **クラスター型ワークロード:**
+        - Databricks料金 = DBU消費量 × DBU単価（ワークロード別）
+        - Driver DBU消費量 = Driver DBU/h × 1ノード × 月間時間
+        - Executor DBU消費量 = Executor DBU/h × ノード数 × 月間時間
+        - EC2料金 = インスタンス時間料金 × 利用時間
+        
+        **SQL Warehouse（Serverless）:**
+        - Databricks料金 = サイズ別DBU/h × クラスタ数 × 月間時間 × DBU単価
+        - EC2料金 = $0（Serverlessのため）
+        """)
+        
+        # 個別ワークロードの計算式（一覧ごとにキャッシュしたMarkdownを1回で描画）
+        st.markdown(build_formula_md(st.session_state.workloads, rate_tables["ec2_price_per_hour"]))
+
+# サイドバーの各フォームはfragmentにして、送信時はそのフォームだけを再実行する
+# （ワークロードを追加・更新した場合はst.rerun()でアプリ全体を再実行して結果に反映）
+@st.fragment
+def workload_form(instance_catalog: dict, rate_tables: dict):
+    """クラスター型ワークロードの追加フォーム"""
+    instance_options = instance_catalog["instance_options"]
+    instance_mapping = instance_catalog["instance_mapping"]
+    executor_options = instance_catalog["executor_options"]
+    executor_mapping = instance_catalog["executor_mapping"]
+    
+    with st.form("workload_form"):
+        workload_name = st.text_input("ワークロード名", value=f"ワークロード{len(st.session_state.workloads)+1}")
+        workload_type = st.selectbox("ワークロードタイプ", ["all-purposeクラスター", "jobsクラスター", "dlt-advancedクラスター"])
+        
+        # クラスター型ワークロード用フィールド
+        driver_option = st.selectbox("Driverインスタンス", instance_options, index=instance_catalog["default_driver_index"])
+        executor_option = st.selectbox("Executorインスタンス", executor_options, index=0)  # 初期値は"Driverと同じ"
+        
+        executor_nodes = st.number_input("Executorノード数", min_value=0, max_value=100, value=2)
+        daily_hours, monthly_days = usage_hours_inputs()
+        photon_enabled = st.checkbox("Photon有効")
+        
+        monthly_hours = show_monthly_hours(daily_hours, monthly_days)
+        
+        submitted = st.form_submit_button("➕ ワークロードを追加", type="primary")
+        
+        if submitted:
+            # クラスター型ワークロード設定
+            # ワークロードタイプから"クラスター"を除去
+            clean_workload_type = workload_type.replace("クラスター", "")
+            
+            workload_config = {
+                **_CLUSTER_CONFIG_DEFAULTS,
+                "workload_name": workload_name,
+                "workload_type": clean_workload_type,
+                "driver_instance": instance_mapping[driver_option],
+                "executor_instance": executor_mapping[executor_option],
+                "executor_nodes": executor_nodes,
+                "daily_hours": daily_hours,
+                "monthly_days": monthly_days,
+                "monthly_hours": monthly_hours,
+                "photon_enabled": photon_enabled,
             }
+            
+            # 計算実行
+            result = calculate_workload_cost(workload_config, rate_tables)
+            if result:
+                st.session_state.workloads.append(result)
+                st.success(f"ワークロード '{workload_name}' を追加しました！")
+                st.rerun()
+
+@st.fragment
+def sql_warehouse_form(sql_warehouse_sizes: list, rate_tables: dict):
+    """SQL Warehouseワークロードの追加フォーム"""
+    with st.form("sql_warehouse_form"):
+        sql_workload_name = st.text_input("SQL Warehouseワークロード名", value=f"SQL Warehouse {sum(1 for w in st.session_state.workloads if w.get('workload_type') == 'sql-warehouse-serverless')+1}")
         
-        # クラスター型ワークロードの場合
-        region_data = databricks_data["enterprise"]["aws"]["ap-northeast-1"]
+        # SQL Warehouseサイズ選択
+        sql_warehouse_size = st.selectbox("SQL Warehouseサイズ", sql_warehouse_sizes, index=3)  # Mediumをデフォルト
+        sql_warehouse_clusters = st.number_input("クラスタ数", min_value=1, max_value=10, value=1)
         
-        # ワークロードキー決定
-        workload_type = config["workload_type"]
-        if config["photon_enabled"]:
-            if workload_type == "all-purpose":
-                workload_key = "all-purpose-photon"
-            elif workload_type == "jobs":
-                workload_key = "jobs-photon"
-            elif workload_type == "dlt-advanced":
-                workload_key = "dlt-advanced-photon"
-        else:
-            workload_key = workload_type
+        sql_daily_hours, sql_monthly_days = usage_hours_inputs(key_prefix="sql_")
         
-        workload_pricing = region_data.get(workload_key, {})
+        sql_monthly_hours = show_monthly_hours(sql_daily_hours, sql_monthly_days)
         
-        # Executorインスタンスがdriverと同じ場合の処理
-        actual_executor_instance = config["executor_instance"]
-        if actual_executor_instance == "same_as_driver":
-            actual_executor_instance = config["driver_instance"]
+        sql_submitted = st.form_submit_button("➕ SQL Warehouseを追加", type="primary")
         
-        # Driver計算
-        driver_data = workload_pricing.get(config["driver_instance"], {})
-        driver_dbu = driver_data.get("dbu_per_hour", 0)
-        driver_rate = driver_data.get("rate_per_hour", 0)
-        driver_monthly = driver_rate * config["monthly_hours"]
+        if sql_submitted:
+            sql_workload_config = {
+                **_SQL_WAREHOUSE_CONFIG_DEFAULTS,
+                "workload_name": sql_workload_name,
+                "sql_warehouse_size": sql_warehouse_size,
+                "sql_warehouse_clusters": sql_warehouse_clusters,
+                "daily_hours": sql_daily_hours,
+                "monthly_days": sql_monthly_days,
+                "monthly_hours": sql_monthly_hours,
+            }
+            
+            # 計算実行
+            sql_result = calculate_workload_cost(sql_workload_config, rate_tables)
+            if sql_result:
+                st.session_state.workloads.append(sql_result)
+                st.success(f"SQL Warehouseワークロード '{sql_workload_name}' を追加しました！")
+                st.rerun()
+
+@st.fragment
+def edit_workload_form(instance_catalog: dict, sql_warehouse_sizes: list, rate_tables: dict):
+    """ワークロードの編集フォーム（編集中のワークロードがある場合のみ表示）"""
+    editing_index = st.session_state.get("editing_index")
+    if editing_index is None:
+        return
+    
+    instance_options = instance_catalog["instance_options"]
+    instance_mapping = instance_catalog["instance_mapping"]
+    executor_options = instance_catalog["executor_options"]
+    executor_mapping = instance_catalog["executor_mapping"]
+    
+    editing_workload = st.session_state.workloads[editing_index]
+    st.subheader("✏️ ワークロード編集")
+    
+    with st.form("edit_workload_form"):
+        edit_name = st.text_input("ワークロード名", value=editing_workload['workload_name'])
+        # SQL Warehouseかクラスターかで分岐
+        if editing_workload['workload_type'] == "sql-warehouse-serverless":
+            # SQL Warehouse編集
+            current_size = editing_workload.get('sql_warehouse_size', 'Medium')
+            current_size_idx = sql_warehouse_sizes.index(current_size) if current_size in sql_warehouse_sizes else 3
+            
+            edit_sql_size = st.selectbox("SQL Warehouseサイズ", sql_warehouse_sizes, index=current_size_idx)
+            edit_sql_clusters = st.number_input("クラスタ数", min_value=1, max_value=10, 
+                                              value=editing_workload.get('sql_warehouse_clusters', 1))
+            
+            edit_daily, edit_monthly_days = usage_hours_inputs(editing_workload.get('daily_hours', 8),
+                                                               editing_workload.get('monthly_days', 20))
+            
+            edit_monthly = show_monthly_hours(edit_daily, edit_monthly_days)
+            
+            col_update, col_cancel = st.columns(2)
+            with col_update:
+                update_submitted = st.form_submit_button("💾 更新", type="primary")
+            with col_cancel:
+                cancel_submitted = st.form_submit_button("❌ キャンセル")
+            
+            if update_submitted:
+                # SQL Warehouse更新設定
+                updated_config = {
+                    **_SQL_WAREHOUSE_CONFIG_DEFAULTS,
+                    "workload_name": edit_name,
+                    "sql_warehouse_size": edit_sql_size,
+                    "sql_warehouse_clusters": edit_sql_clusters,
+                    "daily_hours": edit_daily,
+                    "monthly_days": edit_monthly_days,
+                    "monthly_hours": edit_monthly,
+                }
+                
+                # 再計算
+                result = calculate_workload_cost(updated_config, rate_tables)
+                if result:
+                    st.session_state.workloads[editing_index] = result
+                    del st.session_state.editing_index
+                    st.success(f"SQL Warehouseワークロード '{edit_name}' を更新しました！")
+                    st.rerun()
+            
+            if cancel_submitted:
+                del st.session_state.editing_index
+                st.rerun()
+            
+            return
         
-        # Executor計算
-        executor_data = workload_pricing.get(actual_executor_instance, {})
-        executor_dbu = executor_data.get("dbu_per_hour", 0)
-        executor_rate = executor_data.get("rate_per_hour", 0)
-        executor_monthly = executor_rate * config["executor_nodes"] * config["monthly_hours"]
+        # 編集時のワークロードタイプ表示名の変換  
+        current_type_display = editing_workload['workload_type'] + "クラスター"
+        edit_type_options = ["all-purposeクラスター", "jobsクラスター", "dlt-advancedクラスター"]
         
-        # EC2料金
-        driver_ec2 = ec2_data.get(config["driver_instance"], {}).get("price_per_hour", 0) * config["monthly_hours"]
-        executor_ec2 = ec2_data.get(actual_executor_instance, {}).get("price_per_hour", 0) * config["executor_nodes"] * config["monthly_hours"]
+        edit_type = st.selectbox("ワークロードタイプ", 
+                               edit_type_options,
+                               index=edit_type_options.index(current_type_display))
         
-        return {
-            "workload_name": config["workload_name"],
-            "workload_type": workload_key,
-            "driver_instance": config["driver_instance"],
-            "executor_instance": config["executor_instance"],  # UI表示用（"same_as_driver"の場合もあり）
-            "actual_executor_instance": actual_executor_instance,  # 実際の計算用インスタンス
-            "executor_nodes": config["executor_nodes"],
-            "photon_enabled": config["photon_enabled"],
-            "monthly_hours": config["monthly_hours"],
-            "daily_hours": config.get("daily_hours", 8),
-            "monthly_days": config.get("monthly_days", 20),
-            "driver_dbu": driver_dbu,
-            "executor_dbu": executor_dbu,
-            "total_dbu": (driver_dbu + executor_dbu * config["executor_nodes"]) * config["monthly_hours"],
-            "databricks_monthly": driver_monthly + executor_monthly,
-            "ec2_monthly": driver_ec2 + executor_ec2,
-            "total_monthly": driver_monthly + executor_monthly + driver_ec2 + executor_ec2,
-            "sql_warehouse_size": config.get("sql_warehouse_size", ""),
-            "sql_warehouse_clusters": config.get("sql_warehouse_clusters", 1)
-        }
-    except Exception as e:
-        st.error(f"計算エラー: {e}")
-        return {}
+        # クラスター編集（SQL Warehouseは除外済み）
+        # 現在のインスタンスを選択状態にする
+        option_by_instance = instance_catalog["option_by_instance"]
+        current_driver_option = option_by_instance.get(editing_workload['driver_instance'])
+        current_executor_option = option_by_instance.get(editing_workload['executor_instance'])
+        
+        edit_driver_idx = instance_catalog["instance_index"].get(current_driver_option, 0)
+        edit_executor_idx = instance_catalog["executor_index"].get(current_executor_option, 0)
+        
+        edit_driver = st.selectbox("Driverインスタンス", instance_options, index=edit_driver_idx)
+        edit_executor = st.selectbox("Executorインスタンス", executor_options, index=edit_executor_idx)
+        
+        col_edit1, col_edit2 = st.columns(2)
+        with col_edit1:
+            edit_nodes = st.number_input("Executorノード数", min_value=0, max_value=100, 
+                                       value=editing_workload['executor_nodes'])
+            edit_daily = st.number_input("1日あたりの利用時間", min_value=1, max_value=24, 
+                                       value=editing_workload.get('daily_hours', 8))
+        with col_edit2:
+            edit_monthly_days = st.number_input("月間利用日数", min_value=1, max_value=31, 
+                                              value=editing_workload.get('monthly_days', 20))
+            edit_photon = st.checkbox("Photon有効", value=editing_workload['photon_enabled'])
+        
+        edit_monthly = show_monthly_hours(edit_daily, edit_monthly_days)
+        
+        col_update, col_cancel = st.columns(2)
+        with col_update:
+            update_submitted = st.form_submit_button("💾 更新", type="primary")
+        with col_cancel:
+            cancel_submitted = st.form_submit_button("❌ キャンセル")
+        
+        if update_submitted:
+            # クラスター型ワークロード更新設定（SQL Warehouseは除外済み）
+            # ワークロードタイプから"クラスター"を除去
+            clean_edit_type = edit_type.replace("クラスター", "")
+            
+            updated_config = {
+                **_CLUSTER_CONFIG_DEFAULTS,
+                "workload_name": edit_name,
+                "workload_type": clean_edit_type,
+                "driver_instance": instance_mapping[edit_driver],
+                "executor_instance": executor_mapping[edit_executor],
+                "executor_nodes": edit_nodes,
+                "daily_hours": edit_daily,
+                "monthly_days": edit_monthly_days,
+                "monthly_hours": edit_monthly,
+                "photon_enabled": edit_photon,
+            }
+            
+            # 再計算
+            result = calculate_workload_cost(updated_config, rate_tables)
+            if result:
+                st.session_state.workloads[editing_index] = result
+                del st.session_state.editing_index
+                st.success(f"ワークロード '{edit_name}' を更新しました！")
+                st.rerun()
+        
+        if cancel_submitted:
+            del st.session_state.editing_index
+            st.rerun()
+
+def queue_workload_delete(index: int):
+    """削除ボタンのコールバック（ワークロードの削除を予約）"""
+    st.session_state.pending_deletes.add(index)
+
+def apply_pending_deletes():
+    """削除予約されたワークロードを1回のリスト再構築で取り除く"""
+    pending = st.session_state.pending_deletes
+    
+    # 編集中のワークロードが削除対象なら編集を終了、それ以外は前に詰めた分だけインデックスをずらす
+    editing_index = st.session_state.get("editing_index")
+    if editing_index in pending:
+        del st.session_state.editing_index
+    elif editing_index is not None:
+        st.session_state.editing_index = editing_index - sum(1 for i in pending if i < editing_index)
+    
+    st.session_state.workloads = [w for i, w in enumerate(st.session_state.workloads) if i not in pending]
+    pending.clear()
 
 def main():
     st.set_page_config(page_title="Databricks料金計算", layout="wide")
@@ -178,87 +832,28 @@ def main():
     # セッション状態初期化
     if "workloads" not in st.session_state:
         st.session_state.workloads = []
+    if "pending_deletes" not in st.session_state:
+        st.session_state.pending_deletes = set()
+    
+    # 削除予約されたワークロードを反映
+    if st.session_state.pending_deletes:
+        apply_pending_deletes()
     
     # データ読み込み
-    databricks_data, ec2_data, sql_warehouse_data = load_data()
+    databricks_data, sql_warehouse_sizes, rate_tables, instance_catalog = load_data()
     
     if not databricks_data:
         st.error("料金データが読み込めません")
         return
     
-    # インスタンスタイプ取得とソート
-    try:
-        region_data = databricks_data["enterprise"]["aws"]["ap-northeast-1"]
-        instance_types = set()
-        for workload_data in region_data.values():
-            if isinstance(workload_data, dict):
-                instance_types.update(workload_data.keys())
-        instance_types = sorted(list(instance_types), key=natural_sort_key)
-        st.sidebar.success(f"{len(instance_types)}個のインスタンスタイプが利用可能")
-    except Exception as e:
-        st.error(f"インスタンス取得エラー: {e}")
-        return
-    
-    # スペック付きインスタンスオプション作成
-    instance_options = [format_instance_option(inst, ec2_data) for inst in instance_types]
-    instance_mapping = {opt: inst for opt, inst in zip(instance_options, instance_types)}
-    
-    # Executorインスタンス用オプション（"Driverと同じ"を先頭に追加）
-    executor_options = ["Driverと同じ"] + instance_options
-    executor_mapping = {"Driverと同じ": "same_as_driver"}
-    executor_mapping.update(instance_mapping)
+    # インスタンス一覧・選択肢はキャッシュ済みの読み込み結果から取得
+    st.sidebar.success(f"{len(instance_catalog['instance_types'])}個のインスタンスタイプが利用可能")
     
     # サイドバーにワークロード設定を移動
     with st.sidebar:
         st.header("📝 ワークロード設定")
         
-        with st.form("workload_form"):
-            workload_name = st.text_input("ワークロード名", value=f"ワークロード{len(st.session_state.workloads)+1}")
-            workload_type = st.selectbox("ワークロードタイプ", ["all-purposeクラスター", "jobsクラスター", "dlt-advancedクラスター"])
-            
-            # クラスター型ワークロード用フィールド
-            # デフォルトインデックス設定
-            default_driver_idx = next((i for i, opt in enumerate(instance_options) if "r5.large" in opt), 0)
-            
-            driver_option = st.selectbox("Driverインスタンス", instance_options, index=default_driver_idx)
-            executor_option = st.selectbox("Executorインスタンス", executor_options, index=0)  # 初期値は"Driverと同じ"
-            
-            executor_nodes = st.number_input("Executorノード数", min_value=0, max_value=100, value=2)
-            daily_hours = st.number_input("1日あたりの利用時間", min_value=1, max_value=24, value=8)
-            monthly_days = st.number_input("月間利用日数", min_value=1, max_value=31, value=20)
-            photon_enabled = st.checkbox("Photon有効")
-            
-            # 月間利用時間を自動計算して表示
-            monthly_hours = daily_hours * monthly_days
-            st.info(f"📅 月間利用時間: {monthly_hours}時間 ({daily_hours}時間/日 × {monthly_days}日)")
-            
-            submitted = st.form_submit_button("➕ ワークロードを追加", type="primary")
-            
-            if submitted:
-                # クラスター型ワークロード設定
-                # ワークロードタイプから"クラスター"を除去
-                clean_workload_type = workload_type.replace("クラスター", "")
-                
-                workload_config = {
-                    "workload_name": workload_name,
-                    "workload_type": clean_workload_type,
-                    "driver_instance": instance_mapping[driver_option],
-                    "executor_instance": executor_mapping[executor_option],
-                    "executor_nodes": executor_nodes,
-                    "daily_hours": daily_hours,
-                    "monthly_days": monthly_days,
-                    "monthly_hours": monthly_hours,
-                    "photon_enabled": photon_enabled,
-                    "sql_warehouse_size": "",
-                    "sql_warehouse_clusters": 1
-                }
-                
-                # 計算実行
-                result = calculate_workload_cost(workload_config, databricks_data, ec2_data, sql_warehouse_data)
-                if result:
-                    st.session_state.workloads.append(result)
-                    st.success(f"ワークロード '{workload_name}' を追加しました！")
-                    st.rerun()
+        workload_form(instance_catalog, rate_tables)
 
         # ワークロード管理もサイドバーに
         if st.session_state.workloads:
@@ -272,489 +867,26 @@ def main():
                         st.session_state.editing_index = i
                         st.rerun()
                 with col_del:
-                    if st.button("🗑️", key=f"del_{i}", help="削除"):
-                        st.session_state.workloads.pop(i)
-                        if hasattr(st.session_state, 'editing_index') and st.session_state.editing_index >= i:
-                            if st.session_state.editing_index == i:
-                                del st.session_state.editing_index
-                            else:
-                                st.session_state.editing_index -= 1
-                        st.rerun()
+                    # 削除は予約だけ行い、次の実行の先頭でまとめて反映する
+                    st.button("🗑️", key=f"del_{i}", help="削除",
+                              on_click=queue_workload_delete, args=(i,))
             
             if st.button("🧹 全クリア"):
                 st.session_state.workloads = []
-                if hasattr(st.session_state, 'editing_index'):
-                    del st.session_state.editing_index
+                st.session_state.pop("editing_index", None)
                 st.rerun()
 
         # SQL Warehouse専用セクション
         st.header("🏢 SQL Warehouse設定")
         
-        with st.form("sql_warehouse_form"):
-            sql_workload_name = st.text_input("SQL Warehouseワークロード名", value=f"SQL Warehouse {len([w for w in st.session_state.workloads if w.get('workload_type') == 'sql-warehouse-serverless'])+1}")
-            
-            # SQL Warehouseサイズ選択
-            sql_warehouse_sizes = list(sql_warehouse_data.keys()) if sql_warehouse_data else ["2X-Small", "X-Small", "Small", "Medium", "Large"]
-            sql_warehouse_size = st.selectbox("SQL Warehouseサイズ", sql_warehouse_sizes, index=3)  # Mediumをデフォルト
-            sql_warehouse_clusters = st.number_input("クラスタ数", min_value=1, max_value=10, value=1)
-            
-            sql_daily_hours = st.number_input("1日あたりの利用時間", min_value=1, max_value=24, value=8, key="sql_daily")
-            sql_monthly_days = st.number_input("月間利用日数", min_value=1, max_value=31, value=20, key="sql_monthly_days")
-            
-            # 月間利用時間を自動計算して表示
-            sql_monthly_hours = sql_daily_hours * sql_monthly_days
-            st.info(f"📅 月間利用時間: {sql_monthly_hours}時間 ({sql_daily_hours}時間/日 × {sql_monthly_days}日)")
-            
-            sql_submitted = st.form_submit_button("➕ SQL Warehouseを追加", type="primary")
-            
-            if sql_submitted:
-                sql_workload_config = {
-                    "workload_name": sql_workload_name,
-                    "workload_type": "sql-warehouse-serverless",
-                    "sql_warehouse_size": sql_warehouse_size,
-                    "sql_warehouse_clusters": sql_warehouse_clusters,
-                    "daily_hours": sql_daily_hours,
-                    "monthly_days": sql_monthly_days,
-                    "monthly_hours": sql_monthly_hours,
-                    "driver_instance": "",
-                    "executor_instance": "",
-                    "executor_nodes": 0,
-                    "photon_enabled": False
-                }
-                
-                # 計算実行
-                sql_result = calculate_workload_cost(sql_workload_config, databricks_data, ec2_data, sql_warehouse_data)
-                if sql_result:
-                    st.session_state.workloads.append(sql_result)
-                    st.success(f"SQL Warehouseワークロード '{sql_workload_name}' を追加しました！")
-                    st.rerun()
+        sql_warehouse_form(sql_warehouse_sizes, rate_tables)
 
         # 編集フォームもサイドバーに
-        if hasattr(st.session_state, 'editing_index'):
-            editing_workload = st.session_state.workloads[st.session_state.editing_index]
-            st.subheader("✏️ ワークロード編集")
-            
-            with st.form("edit_workload_form"):
-                edit_name = st.text_input("ワークロード名", value=editing_workload['workload_name'])
-                # SQL Warehouseかクラスターかで分岐
-                if editing_workload['workload_type'] == "sql-warehouse-serverless":
-                    # SQL Warehouse編集
-                    sql_warehouse_sizes = list(sql_warehouse_data.keys()) if sql_warehouse_data else ["2X-Small", "X-Small", "Small", "Medium", "Large"]
-                    current_size_idx = sql_warehouse_sizes.index(editing_workload.get('sql_warehouse_size', 'Medium')) if editing_workload.get('sql_warehouse_size', 'Medium') in sql_warehouse_sizes else 3
-                    
-                    edit_sql_size = st.selectbox("SQL Warehouseサイズ", sql_warehouse_sizes, index=current_size_idx)
-                    edit_sql_clusters = st.number_input("クラスタ数", min_value=1, max_value=10, 
-                                                      value=editing_workload.get('sql_warehouse_clusters', 1))
-                    
-                    edit_daily = st.number_input("1日あたりの利用時間", min_value=1, max_value=24, 
-                                               value=editing_workload.get('daily_hours', 8))
-                    edit_monthly_days = st.number_input("月間利用日数", min_value=1, max_value=31, 
-                                                      value=editing_workload.get('monthly_days', 20))
-                    
-                    # 月間利用時間を自動計算して表示
-                    edit_monthly = edit_daily * edit_monthly_days
-                    st.info(f"📅 月間利用時間: {edit_monthly}時間 ({edit_daily}時間/日 × {edit_monthly_days}日)")
-                    
-                    col_update, col_cancel = st.columns(2)
-                    with col_update:
-                        update_submitted = st.form_submit_button("💾 更新", type="primary")
-                    with col_cancel:
-                        cancel_submitted = st.form_submit_button("❌ キャンセル")
-                    
-                    if update_submitted:
-                        # SQL Warehouse更新設定
-                        updated_config = {
-                            "workload_name": edit_name,
-                            "workload_type": "sql-warehouse-serverless",
-                            "sql_warehouse_size": edit_sql_size,
-                            "sql_warehouse_clusters": edit_sql_clusters,
-                            "daily_hours": edit_daily,
-                            "monthly_days": edit_monthly_days,
-                            "monthly_hours": edit_monthly,
-                            "driver_instance": "",
-                            "executor_instance": "",
-                            "executor_nodes": 0,
-                            "photon_enabled": False
-                        }
-                        
-                        # 再計算
-                        result = calculate_workload_cost(updated_config, databricks_data, ec2_data, sql_warehouse_data)
-                        if result:
-                            st.session_state.workloads[st.session_state.editing_index] = result
-                            del st.session_state.editing_index
-                            st.success(f"SQL Warehouseワークロード '{edit_name}' を更新しました！")
-                            st.rerun()
-                    
-                    if cancel_submitted:
-                        del st.session_state.editing_index
-                        st.rerun()
-                    
-                    return
-                
-                # 編集時のワークロードタイプ表示名の変換  
-                current_type_display = editing_workload['workload_type'] + "クラスター"
-                
-                edit_type = st.selectbox("ワークロードタイプ", 
-                                       ["all-purposeクラスター", "jobsクラスター", "dlt-advancedクラスター"],
-                                       index=["all-purposeクラスター", "jobsクラスター", "dlt-advancedクラスター"].index(current_type_display))
-                
-                # クラスター編集（SQL Warehouseは除外済み）
-                # 現在のインスタンスを選択状態にする
-                current_driver_option = format_instance_option(editing_workload['driver_instance'], ec2_data)
-                current_executor_option = format_instance_option(editing_workload['executor_instance'], ec2_data)
-                
-                edit_driver_idx = instance_options.index(current_driver_option) if current_driver_option in instance_options else 0
-                edit_executor_idx = executor_options.index(current_executor_option) if current_executor_option in executor_options else 0
-                
-                edit_driver = st.selectbox("Driverインスタンス", instance_options, index=edit_driver_idx)
-                edit_executor = st.selectbox("Executorインスタンス", executor_options, index=edit_executor_idx)
-                
-                col_edit1, col_edit2 = st.columns(2)
-                with col_edit1:
-                    edit_nodes = st.number_input("Executorノード数", min_value=0, max_value=100, 
-                                               value=editing_workload['executor_nodes'])
-                    edit_daily = st.number_input("1日あたりの利用時間", min_value=1, max_value=24, 
-                                               value=editing_workload.get('daily_hours', 8))
-                with col_edit2:
-                    edit_monthly_days = st.number_input("月間利用日数", min_value=1, max_value=31, 
-                                                      value=editing_workload.get('monthly_days', 20))
-                    edit_photon = st.checkbox("Photon有効", value=editing_workload['photon_enabled'])
-                
-                # 月間利用時間を自動計算して表示
-                edit_monthly = edit_daily * edit_monthly_days
-                st.info(f"📅 月間利用時間: {edit_monthly}時間 ({edit_daily}時間/日 × {edit_monthly_days}日)")
-                
-                col_update, col_cancel = st.columns(2)
-                with col_update:
-                    update_submitted = st.form_submit_button("💾 更新", type="primary")
-                with col_cancel:
-                    cancel_submitted = st.form_submit_button("❌ キャンセル")
-                
-                if update_submitted:
-                    # クラスター型ワークロード更新設定（SQL Warehouseは除外済み）
-                    # ワークロードタイプから"クラスター"を除去
-                    clean_edit_type = edit_type.replace("クラスター", "")
-                    
-                    updated_config = {
-                        "workload_name": edit_name,
-                        "workload_type": clean_edit_type,
-                        "driver_instance": instance_mapping[edit_driver],
-                        "executor_instance": executor_mapping[edit_executor],
-                        "executor_nodes": edit_nodes,
-                        "daily_hours": edit_daily,
-                        "monthly_days": edit_monthly_days,
-                        "monthly_hours": edit_monthly,
-                        "photon_enabled": edit_photon,
-                        "sql_warehouse_size": "",
-                        "sql_warehouse_clusters": 1
-                    }
-                    
-                    # 再計算
-                    result = calculate_workload_cost(updated_config, databricks_data, ec2_data, sql_warehouse_data)
-                    if result:
-                        st.session_state.workloads[st.session_state.editing_index] = result
-                        del st.session_state.editing_index
-                        st.success(f"ワークロード '{edit_name}' を更新しました！")
-                        st.rerun()
-                
-                if cancel_submitted:
-                    del st.session_state.editing_index
-                    st.rerun()
+        edit_workload_form(instance_catalog, sql_warehouse_sizes, rate_tables)
 
     # メインコンテンツエリア（サイドバーに設定を移動したので全幅使用）
-    st.header("📊 料金計算結果")
-    
-    if not st.session_state.workloads:
-        st.info("サイドバーでワークロードを設定・追加してください")
-    else:
-        # 合計計算
-        total_databricks = sum(w["databricks_monthly"] for w in st.session_state.workloads)
-        total_ec2 = sum(w["ec2_monthly"] for w in st.session_state.workloads)
-        total_dbu = sum(w["total_dbu"] for w in st.session_state.workloads)
-        grand_total = total_databricks + total_ec2
-        
-        # サマリーメトリクス
-        col_m1, col_m2, col_m3 = st.columns(3)
-        with col_m1:
-            st.metric("Databricks月間", f"${total_databricks:,.2f}")
-        with col_m2:
-            st.metric("EC2月間", f"${total_ec2:,.2f}")
-        with col_m3:
-            st.metric("月間合計", f"${grand_total:,.2f}")
-        
-        # スプレッドシート出力機能
-        st.subheader("📊 データ出力")
-        col_export1, col_export2 = st.columns(2)
-        
-        with col_export1:
-            if st.button("📊 Excel形式でダウンロード", type="secondary"):
-                # 詳細データをDataFrameに変換
-                export_data = []
-                for w in st.session_state.workloads:
-                    # DBU単価を計算
-                    dbu_unit_price = w['databricks_monthly'] / w['total_dbu'] if w['total_dbu'] > 0 else 0
-                    
-                    # SQL Warehouseの場合とクラスターの場合で分岐
-                    if w["workload_type"] == "sql-warehouse-serverless":
-                        # SQL Warehouse用のエクスポートデータ
-                        export_data.append({
-                            "ワークロード名": w['workload_name'],
-                            "ワークロードタイプ": w['workload_type'],
-                            "SQL Warehouseサイズ": w.get('sql_warehouse_size', ''),
-                            "クラスタ数": w.get('sql_warehouse_clusters', 1),
-                            "月間利用時間": f"{w['monthly_hours']}時間 ({w.get('daily_hours', 8)}時間/日 × {w.get('monthly_days', 20)}日)",
-                            "DBU/h": f"{w['executor_dbu']:.2f}",
-                            "月間総DBU": f"{w['total_dbu']:.0f}",
-                            "DBU単価": f"${dbu_unit_price:.3f}",
-                            "Databricks料金(月)": f"${w['databricks_monthly']:,.2f}",
-                            "EC2料金(月)": f"${w['ec2_monthly']:,.2f}",
-                            "合計料金(月)": f"${w['total_monthly']:,.2f}"
-                        })
-                    else:
-                        # クラスター型ワークロード用のエクスポートデータ
-                        photon_status = "有効" if w["photon_enabled"] else "無効"
-                        actual_executor = w['actual_executor_instance'] if w['executor_instance'] == 'same_as_driver' else w['executor_instance']
-                        executor_display = f"{actual_executor} ×{w['executor_nodes']}"
-                        if w['executor_instance'] == 'same_as_driver':
-                            executor_display += " (Driverと同じ)"
-                        
-                        export_data.append({
-                            "ワークロード名": w['workload_name'],
-                            "ワークロードタイプ": w['workload_type'],
-                            "Photon": photon_status,
-                            "Driverインスタンス": w['driver_instance'],
-                            "Executorインスタンス": executor_display,
-                            "月間利用時間": f"{w['monthly_hours']}時間 ({w.get('daily_hours', 8)}時間/日 × {w.get('monthly_days', 20)}日)",
-                            "Driver DBU/h": f"{w['driver_dbu']:.2f}",
-                            "Executor DBU/h": f"{w['executor_dbu']:.2f}",
-                            "月間総DBU": f"{w['total_dbu']:.0f}",
-                            "DBU単価": f"${dbu_unit_price:.3f}",
-                            "Databricks料金(月)": f"${w['databricks_monthly']:,.2f}",
-                            "EC2料金(月)": f"${w['ec2_monthly']:,.2f}",
-                            "合計料金(月)": f"${w['total_monthly']:,.2f}"
-                        })
-                
-                export_df = pd.DataFrame(export_data)
-                
-                # Excel出力
-                excel_buffer = io.BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                    export_df.to_excel(writer, sheet_name='Databricks料金計算結果', index=False)
-                    
-                    # サマリー情報も追加
-                    summary_df = pd.DataFrame({
-                        "項目": ["Databricks月間合計", "EC2月間合計", "総月間料金", "総DBU消費量"],
-                        "金額・数量": [f"${total_databricks:,.2f}", f"${total_ec2:,.2f}", f"${grand_total:,.2f}", f"{total_dbu:,.0f} DBU"]
-                    })
-                    summary_df.to_excel(writer, sheet_name='サマリー', index=False)
-                
-                excel_buffer.seek(0)
-                
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                
-                st.download_button(
-                    label="📊 Excelファイルをダウンロード",
-                    data=excel_buffer.getvalue(),
-                    file_name=f"databricks_料金計算_{timestamp}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-        
-        with col_export2:
-            # CSV出力
-            export_data = []
-            for w in st.session_state.workloads:
-                dbu_unit_price = w['databricks_monthly'] / w['total_dbu'] if w['total_dbu'] > 0 else 0
-                
-                # SQL Warehouseの場合とクラスターの場合で分岐
-                if w["workload_type"] == "sql-warehouse-serverless":
-                    # SQL Warehouse用のエクスポートデータ
-                    export_data.append({
-                        "ワークロード名": w['workload_name'],
-                        "ワークロードタイプ": w['workload_type'],
-                        "SQL Warehouseサイズ": w.get('sql_warehouse_size', ''),
-                        "クラスタ数": w.get('sql_warehouse_clusters', 1),
-                        "月間利用時間": f"{w['monthly_hours']}時間 ({w.get('daily_hours', 8)}時間/日 × {w.get('monthly_days', 20)}日)",
-                        "DBU/h": f"{w['executor_dbu']:.2f}",
-                        "月間総DBU": f"{w['total_dbu']:.0f}",
-                        "DBU単価": f"${dbu_unit_price:.3f}",
-                        "Databricks料金(月)": f"${w['databricks_monthly']:,.2f}",
-                        "EC2料金(月)": f"${w['ec2_monthly']:,.2f}",
-                        "合計料金(月)": f"${w['total_monthly']:,.2f}"
-                    })
-                else:
-                    # クラスター型ワークロード用のエクスポートデータ
-                    photon_status = "有効" if w["photon_enabled"] else "無効"
-                    actual_executor = w['actual_executor_instance'] if w['executor_instance'] == 'same_as_driver' else w['executor_instance']
-                    executor_display = f"{actual_executor} ×{w['executor_nodes']}"
-                    if w['executor_instance'] == 'same_as_driver':
-                        executor_display += " (Driverと同じ)"
-                    
-                    export_data.append({
-                        "ワークロード名": w['workload_name'],
-                        "ワークロードタイプ": w['workload_type'],
-                        "Photon": photon_status,
-                        "Driverインスタンス": w['driver_instance'],
-                        "Executorインスタンス": executor_display,
-                        "月間利用時間": f"{w['monthly_hours']}時間 ({w.get('daily_hours', 8)}時間/日 × {w.get('monthly_days', 20)}日)",
-                        "Driver DBU/h": f"{w['driver_dbu']:.2f}",
-                        "Executor DBU/h": f"{w['executor_dbu']:.2f}",
-                        "月間総DBU": f"{w['total_dbu']:.0f}",
-                        "DBU単価": f"${dbu_unit_price:.3f}",
-                        "Databricks料金(月)": f"${w['databricks_monthly']:,.2f}",
-                        "EC2料金(月)": f"${w['ec2_monthly']:,.2f}",
-                        "合計料金(月)": f"${w['total_monthly']:,.2f}"
-                    })
-            
-            export_df = pd.DataFrame(export_data)
-            csv_buffer = io.StringIO()
-            export_df.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
-            csv_data = csv_buffer.getvalue()
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            st.download_button(
-                label="📄 CSVファイルをダウンロード",
-                data=csv_data,
-                file_name=f"databricks_料金計算_{timestamp}.csv",
-                mime="text/csv"
-            )
-        
-        # ワークロード明細テーブル
-        st.subheader("📋 ワークロード明細")
-        
-        workload_summary = []
-        for w in st.session_state.workloads:
-            # SQL Warehouseの場合とクラスターの場合で分岐
-            if w["workload_type"] == "sql-warehouse-serverless":
-                # SQL Warehouse用のサマリー表示
-                workload_summary.append({
-                    "ワークロード名": w['workload_name'],
-                    "タイプ": w["workload_type"],
-                    "サイズ": w.get('sql_warehouse_size', ''),
-                    "クラスタ数": f"×{w.get('sql_warehouse_clusters', 1)}",
-                    "月間時間": f"{w['monthly_hours']}h ({w.get('daily_hours', 8)}h/日×{w.get('monthly_days', 20)}日)",
-                    "Databricks": f"${w['databricks_monthly']:,.0f}",
-                    "EC2": f"${w['ec2_monthly']:,.0f}",
-                    "合計": f"${w['total_monthly']:,.0f}"
-                })
-            else:
-                # クラスター型ワークロード用のサマリー表示
-                photon_mark = "⚡" if w["photon_enabled"] else ""
-                workload_summary.append({
-                    "ワークロード名": f"{w['workload_name']} {photon_mark}",
-                    "タイプ": w["workload_type"],
-                    "Driver": w["driver_instance"],
-                    "Executor": f"{w['actual_executor_instance'] if w['executor_instance'] == 'same_as_driver' else w['executor_instance']} ×{w['executor_nodes']}",
-                    "月間時間": f"{w['monthly_hours']}h ({w.get('daily_hours', 8)}h/日×{w.get('monthly_days', 20)}日)",
-                    "Databricks": f"${w['databricks_monthly']:,.0f}",
-                    "EC2": f"${w['ec2_monthly']:,.0f}",
-                    "合計": f"${w['total_monthly']:,.0f}"
-                })
-        
-        st.dataframe(pd.DataFrame(workload_summary), use_container_width=True, hide_index=True)
-        
-        # 詳細分析
-        with st.expander("🔍 詳細分析"):
-            st.write(f"**総DBU消費量:** {total_dbu:,.0f} DBU/月")
-            st.write(f"**実効DBU単価:** ${total_databricks/total_dbu:.3f}/DBU" if total_dbu > 0 else "DBU単価計算不可")
-            
-            # 個別ワークロード詳細
-            for w in st.session_state.workloads:
-                st.write(f"**{w['workload_name']}:**")
-                if w["workload_type"] == "sql-warehouse-serverless":
-                    # SQL Warehouse用の詳細表示
-                    st.write(f"- SQL Warehouseサイズ: {w.get('sql_warehouse_size', '')}, クラスタ数: {w.get('sql_warehouse_clusters', 1)}")
-                    st.write(f"- DBU消費量: {w['executor_dbu']:.2f}/h per cluster")
-                    st.write(f"- 月間DBU: {w['total_dbu']:,.0f} DBU")
-                else:
-                    # クラスター型ワークロード用の詳細表示
-                    st.write(f"- Driver DBU: {w['driver_dbu']:.2f}/h, Executor DBU: {w['executor_dbu']:.2f}/h")
-                    st.write(f"- 月間DBU: {w['total_dbu']:,.0f} DBU")
-                st.write("")
-        
-        # 計算式表示
-        with st.expander("📐 計算式の詳細"):
-            st.markdown("### 💡 料金計算の仕組み")
-            st.markdown("""
-            **クラスター型ワークロード:**
-            - Databricks料金 = DBU消費量 × DBU単価（ワークロード別）
-            - Driver DBU消費量 = Driver DBU/h × 1ノード × 月間時間
-            - Executor DBU消費量 = Executor DBU/h × ノード数 × 月間時間
-            - EC2料金 = インスタンス時間料金 × 利用時間
-            
-            **SQL Warehouse（Serverless）:**
-            - Databricks料金 = サイズ別DBU/h × クラスタ数 × 月間時間 × DBU単価
-            - EC2料金 = $0（Serverlessのため）
-            """)
-            
-            # 個別ワークロードの計算式
-            for i, w in enumerate(st.session_state.workloads):
-                if w["workload_type"] == "sql-warehouse-serverless":
-                    # SQL Warehouse用の計算式表示
-                    st.markdown(f"### 📋 {w['workload_name']} (SQL Warehouse)")
-                    
-                    st.markdown(f"""
-                    **🏢 SQL Warehouse構成:**
-                    - サイズ: {w.get('sql_warehouse_size', '')}
-                    - クラスタ数: {w.get('sql_warehouse_clusters', 1)}
-                    - 月間稼働時間: {w['monthly_hours']}時間 ({w.get('daily_hours', 8)}時間/日 × {w.get('monthly_days', 20)}日)
-                    
-                    **💎 Databricks料金計算:**
-                    ```
-                    SQL Warehouse DBU: {w['executor_dbu']:.2f} DBU/h per cluster
-                    総DBU消費量: {w['executor_dbu']:.2f} DBU/h × {w.get('sql_warehouse_clusters', 1)}クラスタ × {w['monthly_hours']}h = {w['total_dbu']:.0f} DBU
-                    DBU単価: ${w['databricks_monthly'] / w['total_dbu'] if w['total_dbu'] > 0 else 0:.3f}/DBU
-                    Databricks料金: {w['total_dbu']:.0f} DBU × ${w['databricks_monthly'] / w['total_dbu'] if w['total_dbu'] > 0 else 0:.3f}/DBU = ${w['databricks_monthly']:,.2f}
-                    ```
-                    
-                    **🔧 EC2料金:**
-                    ```
-                    EC2料金: $0.00 (Serverlessのため)
-                    ```
-                    
-                    **💰 総合計:**
-                    ```
-                    ${w['databricks_monthly']:,.2f} (Databricks) + $0.00 (EC2) = ${w['total_monthly']:,.2f}
-                    ```
-                    """)
-                else:
-                    # クラスター型ワークロード用の計算式表示
-                    photon_note = " (Photon有効)" if w['photon_enabled'] else ""
-                    st.markdown(f"### 📋 {w['workload_name']}{photon_note}")
-                    
-                    # EC2料金情報を取得
-                    driver_ec2_rate = ec2_data.get(w['driver_instance'], {}).get("price_per_hour", 0)
-                    executor_ec2_rate = ec2_data.get(w['actual_executor_instance'], {}).get("price_per_hour", 0)
-                    
-                    st.markdown(f"""
-                    **🖥️ インスタンス構成:**
-                    - Driver: {w['driver_instance']} × 1ノード
-                    - Executor: {w['actual_executor_instance'] if w['executor_instance'] == 'same_as_driver' else w['executor_instance']} × {w['executor_nodes']}ノード{' (Driverと同じ)' if w['executor_instance'] == 'same_as_driver' else ''}
-                    - 月間稼働時間: {w['monthly_hours']}時間 ({w.get('daily_hours', 8)}時間/日 × {w.get('monthly_days', 20)}日)
-                    
-                    **💎 Databricks料金計算:**
-                    ```
-                    Driver:  {w['driver_dbu']:.2f} DBU/h × 1ノード × {w['monthly_hours']}h = {w['driver_dbu'] * w['monthly_hours']:.0f} DBU
-                    Executor: {w['executor_dbu']:.2f} DBU/h × {w['executor_nodes']}ノード × {w['monthly_hours']}h = {w['executor_dbu'] * w['executor_nodes'] * w['monthly_hours']:.0f} DBU
-                    合計DBU: {w['total_dbu']:.0f} DBU
-                    DBU単価: {w['databricks_monthly'] / w['total_dbu'] if w['total_dbu'] > 0 else 0:.3f}$/DBU
-                    Databricks料金: {w['total_dbu']:.0f} DBU × {w['databricks_monthly'] / w['total_dbu'] if w['total_dbu'] > 0 else 0:.3f}$/DBU = ${w['databricks_monthly']:,.2f}
-                    ```
-                    
-                    **🔧 EC2料金計算:**
-                    ```
-                    Driver EC2:  ${driver_ec2_rate:.4f}/h × 1ノード × {w['monthly_hours']}h = ${driver_ec2_rate * w['monthly_hours']:,.2f}
-                    Executor EC2: ${executor_ec2_rate:.4f}/h × {w['executor_nodes']}ノード × {w['monthly_hours']}h = ${executor_ec2_rate * w['executor_nodes'] * w['monthly_hours']:,.2f}
-                    EC2合計: ${w['ec2_monthly']:,.2f}
-                    ```
-                    
-                    **💰 総合計:**
-                    ```
-                    ${w['databricks_monthly']:,.2f} (Databricks) + ${w['ec2_monthly']:,.2f} (EC2) = ${w['total_monthly']:,.2f}
-                    ```
-                    """)
-                
-                if i < len(st.session_state.workloads) - 1:
-                    st.markdown("---")
+    # 結果パネル内の操作（出力ボタン・計算式表示など）ではこのパネルだけを再実行する
+    render_results(rate_tables)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,175 +2,118 @@
 """
 Test script to verify the new pricing data integration
 """
+import os
 import sys
-import json
-from pathlib import Path
+from itertools import islice
+from typing import NamedTuple
+
+import pytest
 
 # Add src directory to path
-sys.path.append(str(Path(__file__).parent / "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from app import load_data, calculate_workload_cost
+
+# Fields every instance entry in the pricing data must have
+_REQUIRED = frozenset(("dbu_per_hour", "rate_per_hour"))
+
+# Workload config fields shared by every test case
+_BASE = dict(
+    driver_instance="m5.large",
+    executor_instance="m5.xlarge",
+    executor_nodes=2,
+    daily_hours=8,
+    monthly_days=20,
+    monthly_hours=160,
+)
+# The Photon cases run on m5d: the pricing data has no Photon rates for m5.large/m5.xlarge
+_BASE_M5D = {**_BASE, "driver_instance": "m5d.large", "executor_instance": "m5d.xlarge"}
+
+# (name, config) pairs for test_workload_calculations
+_CASES = (
+    ("All-Purpose Standard",
+     {**_BASE, "workload_type": "all-purpose", "workload_name": "データ分析", "photon_enabled": False}),
+    ("All-Purpose Photon",
+     {**_BASE_M5D, "workload_type": "all-purpose", "workload_name": "データ分析（Photon）", "photon_enabled": True}),
+    ("Jobs Compute",
+     {**_BASE, "workload_type": "jobs", "workload_name": "バッチジョブ", "photon_enabled": False}),
+    ("DLT Advanced",
+     {**_BASE, "workload_type": "dlt-advanced", "workload_name": "データパイプライン", "photon_enabled": False}),
+    ("Jobs Photon",
+     {**_BASE_M5D, "workload_type": "jobs", "workload_name": "バッチジョブ（Photon）", "photon_enabled": True}),
+    ("DLT Advanced Photon",
+     {**_BASE_M5D, "workload_type": "dlt-advanced", "workload_name": "データパイプライン（Photon）", "photon_enabled": True}),
+)
 
-from app import DatabricksCostCalculator, WorkloadConfig
+# Report printed for each calculation test case
+_REPORT_TEMPLATE = (
+    "\n📊 {name}:\n"
+    "   💰 DBU Price: ${dbu_unit_price:.3f}\n"
+    "   🚗 Driver: {driver_dbu} DBU/h\n"
+    "   ⚡ Executor: {executor_dbu} DBU/h\n"
+    "   📈 Total Monthly DBU: {total_dbu:.1f}\n"
+    "   💵 Monthly Cost: ${databricks_monthly:.2f}\n"
+    "{status}\n"
+)
 
-def test_pricing_data_loading():
+class PricingData(NamedTuple):
+    """Values returned by load_data()"""
+    databricks_data: dict
+    sql_warehouse_sizes: dict
+    rate_tables: dict
+    instance_catalog: dict
+
+@pytest.fixture(scope="module")
+def pricing():
+    """Pricing data loaded once and shared by both tests"""
+    return PricingData(*load_data())
+
+def test_pricing_data_loading(pricing):
     """Test that the new pricing data loads correctly"""
     print("🔍 Testing pricing data loading...")
     
-    calculator = DatabricksCostCalculator()
-    
     # Check if the new data structure is loaded
     try:
-        region_data = calculator.pricing_data["databricks"]["enterprise"]["aws"]["ap-northeast-1"]
-        print("✅ New pricing data structure loaded successfully")
-        
-        # Check available workload types
-        workload_types = list(region_data.keys())
-        print(f"📋 Available workload types: {workload_types}")
-        
-        # Check sample instance data for each workload type
-        for workload_type in workload_types:
-            workload_data = region_data[workload_type]
-            sample_instances = list(workload_data.keys())[:3]  # First 3 instances
-            print(f"   {workload_type}: {len(workload_data)} instances (sample: {sample_instances})")
-            
-            # Check data structure for first instance
-            if sample_instances:
-                instance_data = workload_data[sample_instances[0]]
-                required_fields = ["dbu_per_hour", "rate_per_hour"]
-                has_all_fields = all(field in instance_data for field in required_fields)
-                print(f"   {sample_instances[0]}: {instance_data} (valid: {has_all_fields})")
-        
-        return True
+        region_data = pricing.databricks_data["enterprise"]["aws"]["ap-northeast-1"]
     except KeyError as e:
-        print(f"❌ Failed to load new pricing data structure: {e}")
-        return False
-
-def test_workload_calculations():
-    """Test calculations with different workload types"""
-    print("\n🧮 Testing workload calculations...")
-    
-    calculator = DatabricksCostCalculator()
+        pytest.fail(f"❌ Failed to load new pricing data structure: {e}")
+    print("✅ New pricing data structure loaded successfully")
     
-    test_configs = [
-        {
-            "name": "All-Purpose Standard",
-            "config": WorkloadConfig(
-                workload_type="all-purpose",
-                workload_purpose="データ分析",
-                driver_instance_type="m5.large",
-                executor_instance_type="m5.xlarge",
-                executor_node_count=2,
-                daily_hours=8,
-                monthly_hours=160,
-                photon_enabled=False,
-                region="ap-northeast-1"
-            )
-        },
-        {
-            "name": "All-Purpose Photon",
-            "config": WorkloadConfig(
-                workload_type="all-purpose",
-                workload_purpose="データ分析（Photon）",
-                driver_instance_type="m5.large",
-                executor_instance_type="m5.xlarge",
-                executor_node_count=2,
-                daily_hours=8,
-                monthly_hours=160,
-                photon_enabled=True,
-                region="ap-northeast-1"
-            )
-        },
-        {
-            "name": "Jobs Compute",
-            "config": WorkloadConfig(
-                workload_type="jobs",
-                workload_purpose="バッチジョブ",
-                driver_instance_type="m5.large",
-                executor_instance_type="m5.xlarge",
-                executor_node_count=2,
-                daily_hours=8,
-                monthly_hours=160,
-                photon_enabled=False,
-                region="ap-northeast-1"
-            )
-        },
-        {
-            "name": "DLT Advanced",
-            "config": WorkloadConfig(
-                workload_type="dlt-advanced",
-                workload_purpose="データパイプライン",
-                driver_instance_type="m5.large",
-                executor_instance_type="m5.xlarge",
-                executor_node_count=2,
-                daily_hours=8,
-                monthly_hours=160,
-                photon_enabled=False,
-                region="ap-northeast-1"
-            )
-        },
-        {
-            "name": "Jobs Photon",
-            "config": WorkloadConfig(
-                workload_type="jobs",
-                workload_purpose="バッチジョブ（Photon）",
-                driver_instance_type="m5d.large",
-                executor_instance_type="m5d.xlarge",
-                executor_node_count=2,
-                daily_hours=8,
-                monthly_hours=160,
-                photon_enabled=True,
-                region="ap-northeast-1"
-            )
-        },
-        {
-            "name": "DLT Advanced Photon",
-            "config": WorkloadConfig(
-                workload_type="dlt-advanced",
-                workload_purpose="データパイプライン（Photon）",
-                driver_instance_type="m5d.large",
-                executor_instance_type="m5d.xlarge",
-                executor_node_count=2,
-                daily_hours=8,
-                monthly_hours=160,
-                photon_enabled=True,
-                region="ap-northeast-1"
-            )
-        }
-    ]
+    # Check available workload types
+    workload_types = list(region_data.keys())
+    print(f"📋 Available workload types: {workload_types}")
     
-    for test_case in test_configs:
-        print(f"\n📊 {test_case['name']}:")
-        try:
-            result = calculator.calculate_databricks_cost(test_case['config'])
-            
-            print(f"   💰 DBU Price: ${result['dbu_price']:.3f}")
-            print(f"   🚗 Driver: {result['driver_dbu_rate']} DBU/h")
-            print(f"   ⚡ Executor: {result['executor_dbu_rate']} DBU/h")
-            print(f"   📈 Total Monthly DBU: {result['total_dbu_monthly']:.1f}")
-            print(f"   💵 Monthly Cost: ${result['databricks_cost_monthly']:.2f}")
+    # Check sample instance data for each workload type
+    for workload_type in workload_types:
+        workload_data = region_data[workload_type]
+        sample_instances = list(islice(workload_data, 3))  # First 3 instances
+        print(f"   {workload_type}: {len(workload_data)} instances (sample: {sample_instances})")
+        
+        # Check data structure for first instance
+        if sample_instances:
+            instance_data = workload_data[sample_instances[0]]
+            has_all_fields = instance_data.keys() >= _REQUIRED
+            print(f"   {sample_instances[0]}: {instance_data} (valid: {has_all_fields})")
             
-            # Validate result
-            if result['databricks_cost_monthly'] > 0:
-                print("   ✅ Calculation successful")
-            else:
-                print("   ⚠️  Zero cost - check pricing data")
-                
-        except Exception as e:
-            print(f"   ❌ Calculation failed: {e}")
+            # Stop at the first malformed entry
+            assert has_all_fields, \
+                f"Missing required fields in {workload_type}: {sorted(_REQUIRED - instance_data.keys())}"
 
-def main():
-    """Main test function"""
-    print("🚀 Testing Databricks Cost Calculator Pricing Integration\n")
-    
-    # Test 1: Data loading
-    data_loaded = test_pricing_data_loading()
+@pytest.mark.parametrize("name, config", _CASES, ids=[name for name, _ in _CASES])
+def test_workload_calculations(pricing, name, config):
+    """Test calculations with different workload types"""
+    result = calculate_workload_cost(config, pricing.rate_tables)
+    assert result, f"❌ Calculation failed: {name}"
     
-    if data_loaded:
-        # Test 2: Calculations
-        test_workload_calculations()
+    # Validate result
+    if result['databricks_monthly'] > 0:
+        status = "   ✅ Calculation successful"
     else:
-        print("❌ Skipping calculation tests due to data loading issues")
+        status = "   ⚠️  Zero cost - check pricing data"
     
-    print("\n✨ Testing completed!")
+    # Build the whole report for a case and write it in one call
+    sys.stdout.write(_REPORT_TEMPLATE.format_map({**result, "name": name, "status": status}))
+    assert result['databricks_monthly'] > 0, f"Zero cost for {name} - check pricing data"
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(pytest.main([__file__, "-s"]))
\ No newline at end of file
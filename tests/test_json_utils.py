@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import json_utils
+from json_utils import json_dumps_bytes, json_loads
+
+
+def test_json_loads_strips_bom_from_bytes_and_str():
+    assert json_loads(b'\xef\xbb\xbf{"size": "Medium"}') == {"size": "Medium"}
+    assert json_loads('\ufeff{"size": "Medium"}') == {"size": "Medium"}
+
+
+def test_json_dumps_bytes_fallback_keeps_non_ascii(monkeypatch):
+    monkeypatch.setattr(json_utils, "orjson", None)
+
+    dumped = json_dumps_bytes({"name": "データ分析"})
+
+    assert "データ分析".encode("utf-8") in dumped
+    assert json_loads(dumped) == {"name": "データ分析"}
@@ -0,0 +1,31 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from pricing_updater import PricingDataUpdater, json_loads
+
+
+def make_updater(tmp_path):
+    return PricingDataUpdater(data_path=tmp_path)
+
+
+def test_upload_custom_pricing_strips_bom(tmp_path):
+    updater = make_updater(tmp_path)
+    uploaded = io.BytesIO(b'\xef\xbb\xbf{"m5.large": {"us-east-1": {"price_per_hour": 0.096}}}')
+
+    assert updater.upload_custom_pricing(uploaded, "ec2")
+
+    saved = (tmp_path / "ec2_pricing.json").read_bytes()
+    assert not saved.startswith(b"\xef\xbb\xbf")
+    assert json_loads(saved) == {"m5.large": {"us-east-1": {"price_per_hour": 0.096}}}
+    assert updater.get_last_update_info()["ec2"] is not None
+    assert updater.get_last_update_info()["databricks"] is None
+
+
+def test_upload_custom_pricing_rejects_invalid_json(tmp_path):
+    updater = make_updater(tmp_path)
+
+    assert not updater.upload_custom_pricing(io.BytesIO(b"{not json"), "ec2")
+    assert not (tmp_path / "ec2_pricing.json").exists()